@@ -0,0 +1,499 @@
+"""Benchmark suite for gds_tools.
+
+Runs a set of synthetic but realistic workloads (routing, transforms on large
+connected graphs, booleans on dense lattices and cell I/O) and records the
+timings as JSON, so runs on different gdspy versions or commits can be compared.
+
+Usage:
+    python benchmarks/run.py                            # full suite
+    python benchmarks/run.py --quick                    # smaller workloads
+    python benchmarks/run.py -k router -o new.json      # only matching cases
+    python benchmarks/run.py --compare old.json         # compare with earlier run
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import itertools
+import contextlib
+import subprocess
+
+import numpy as np
+import gdspy as gd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import gds_tools as gtools
+
+# Registry of benchmark cases, filled by the @case decorator
+CASES = []
+
+# gdspy keeps a global library with unique cell names
+_cell_id = itertools.count()
+
+def new_cell(prefix = 'BENCH'):
+    return gd.Cell(prefix + '_' + str(next(_cell_id)))
+
+#======================
+# Register a benchmark \\
+#=========================================================================
+# Arguments:    name    :   name of the benchmark case                  ||
+#               params  :   list of parameter dicts, one run per entry  ||
+#               quick   :   list of parameter dicts for --quick runs    ||
+#=========================================================================
+def case(name, params, quick = None):
+
+    def register(fnc):
+        CASES.append({'name': name, 'setup': fnc, 'params': params, 'quick': quick if quick != None else params[:1]})
+        return fnc
+
+    return register
+
+#=======================
+# Synthetic layout data \\
+#=========================================================================
+# Scatter nobs boxes in a (size x size) field, keeping the corners where ||
+# the route endpoints are placed free. Seeded, so runs are reproducible. ||
+#=========================================================================
+def obstacle_field(cell, size, nobs, seed = 0):
+
+    rng = np.random.default_rng(seed)
+
+    fr_str = gtools.geometry.box((2, 2))
+    to_str = gtools.geometry.box((2, 2)).mov((size - 2, size - 2))
+    objs = [fr_str, to_str]
+
+    while len(objs) < nobs + 2:
+        w, h = rng.uniform(1, size / 8, 2)
+        x, y = rng.uniform(0, size - max(w, h), 2)
+        if (x < 4 and y < 4) or (x + w > size - 4 and y + h > size - 4):
+            continue
+        objs.append(gtools.geometry.box((w, h)).mov((x, y)))
+
+    gtools.add(cell, objs)
+
+    return fr_str, to_str
+
+def chain(n, length = 10, width = 1):
+
+    objs = [gtools.routing.line((0, length), width)]
+    for i in range(1, n):
+        objs.append(gtools.routing.line((0, length), width).con('A', objs[-1], 'B'))
+
+    return objs
+
+def tree(depth, length = 10, width = 1):
+
+    root = gtools.geometry.box((width, width))
+    leaves = [root]
+    objs = [root]
+    for d in range(depth):
+        new_leaves = []
+        for leaf in leaves:
+            for ep in ['A', 'D']:
+                l = gtools.routing.line((0, length), width).con('A', leaf, ep)
+                new_leaves.append(l)
+                objs.append(l)
+        leaves = [gtools.geometry.box((width, width)).con('B', l, 'B') for l in new_leaves]
+        objs += leaves
+
+    return objs
+
+def box_grid(n, size = 1, pitch = 2):
+
+    return [gtools.geometry.box((size, size)).mov((pitch * (i % n), pitch * (i // n))) for i in range(n * n)]
+
+#============
+# Benchmarks \\
+#=========================================================================
+# Each case receives its parameters and returns a callable that runs    ||
+# the timed workload once. Everything outside the callable is setup.    ||
+#=========================================================================
+@case('router', [{'size': s, 'detect': d} for s in [20, 40, 80] for d in ['native', 'custom']],
+      quick = [{'size': 20, 'detect': 'native'}, {'size': 20, 'detect': 'custom'}])
+def bench_router(size, detect):
+
+    cell = new_cell()
+    fr_str, to_str = obstacle_field(cell, size, size // 4)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            gtools.routing.router(cell, fr_str, 'Y', to_str, 'W', 0.5, 2, detect = detect, nop = 5, dist_multi = 1)
+
+    return run
+
+@case('inside', [{'points': n, 'method': m} for n in [10000, 100000] for m in ['native', 'index']],
+      quick = [{'points': 10000, 'method': 'native'}, {'points': 10000, 'method': 'index'}])
+def bench_inside(points, method):
+
+    cell = new_cell()
+    obstacle_field(cell, 1000, 500)
+    ref = gd.CellReference(cell)
+    pts = np.random.default_rng(0).uniform(0, 1000, (points, 2))
+
+    def run():
+        if method == 'index':
+            gtools.PolygonIndex(ref).inside(pts)
+        else:
+            gd.inside(pts, ref)
+
+    return run
+
+@case('router_sparse', [{'size': s, 'grid': g} for s in [200, 500] for g in ['uniform', 'hanan']])
+def bench_router_sparse(size, grid):
+
+    cell = new_cell()
+    fr_str = gtools.geometry.box((10, 10))
+    to_str = gtools.geometry.box((10, 10)).mov((size, size))
+    walls = [gtools.geometry.box((size * 0.6, 20)).mov((0, size * 0.4)), gtools.geometry.box((20, size * 0.8)).mov((size * 0.6, size * 0.1))]
+    gtools.add(cell, [fr_str, to_str] + walls)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            gtools.routing.router(cell, fr_str, 'Y', to_str, 'W', 2, 5, grid_s = 2, grid = grid, clearance = 3)
+
+    return run
+
+@case('layer_router', [{'size': s, 'layers': n} for s in [200, 500] for n in [2, 4]])
+def bench_layer_router(size, layers):
+
+    cell = new_cell()
+    fr_str = gtools.geometry.box((10, 10))
+    to_str = gtools.geometry.box((10, 10)).mov((size, size))
+
+    # Every layer is blocked by a wall somewhere, routes have to change layers to get through
+    walls = [gtools.geometry.box((size * 1.2, 10), layer = l).mov((-size * 0.1, size * (l + 1) / (layers + 1))) for l in range(layers)]
+    gtools.add(cell, [fr_str, to_str] + walls)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            gtools.routing.layer_router(cell, fr_str, 'Y', to_str, 'W', 2, 5, list(range(layers)), grid_s = 2, via_cost = 20, bend_cost = 2, clearance = 3)
+
+    return run
+
+@case('router_cached', [{'size': 40}, {'size': 80}])
+def bench_router_cached(size):
+
+    cell = new_cell()
+    fr_str, to_str = obstacle_field(cell, size, size // 4)
+    cache = gtools.DiskCache(tempfile.mkdtemp())
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            cache.router(cell, fr_str, 'Y', to_str, 'W', 0.5, 2)
+
+    return run
+
+@case('connect_chain', [{'n': 100}, {'n': 250}, {'n': 500}])
+def bench_connect_chain(n):
+
+    def run():
+        chain(n)
+
+    return run
+
+@case('rotate_chain', [{'n': 100}, {'n': 250}, {'n': 500}])
+def bench_rotate_chain(n):
+
+    objs = chain(n)
+
+    def run():
+        objs[0].rot(np.pi / 7)
+
+    return run
+
+@case('rotate_tree', [{'depth': 5}, {'depth': 7}, {'depth': 9}])
+def bench_rotate_tree(depth):
+
+    objs = tree(depth)
+
+    def run():
+        objs[0].rot(np.pi / 7)
+
+    return run
+
+@case('auto_connect', [{'n': 1000}, {'n': 5000}, {'n': 20000}])
+def bench_auto_connect(n):
+
+    def run():
+        objs = []
+        for i in range(n):
+            objs.append(gtools.routing.line((0, 10), 1).mov((20 * (i % 100), 40 * (i // 100))))
+            objs.append(gtools.routing.line((0, 10), 1).mov((20 * (i % 100), 40 * (i // 100) + 10)))
+        gtools.auto_connect(objs)
+
+    return run
+
+@case('endpoint_nearest', [{'n': 1000}, {'n': 10000}])
+def bench_endpoint_nearest(n):
+
+    rng = np.random.default_rng(0)
+    objs = [gtools.geometry.box((1, 1)).mov(tuple(xy)) for xy in rng.uniform(0, 10 * np.sqrt(n), (n, 2))]
+    index = gtools.EndpointIndex(objs)
+    queries = rng.uniform(0, 10 * np.sqrt(n), (1000, 2))
+
+    def run():
+        objs[0].mov((1, 0))
+        for q in queries:
+            index.nearest(q, width = 1, open_only = True)
+
+    return run
+
+@case('design_update', [{'n': 100}, {'n': 400}])
+def bench_design_update(n):
+
+    objs = chain(n)
+    m = gtools.routing.meander(3, 1, 2, 20, 5).con('A', objs[n // 2], 'B')
+    objs[n // 2 + 1].con('A', m, 'B')
+    design = gtools.Design(objs + [m], new_cell())
+
+    def run():
+        m.args.n = 4 if m.args.n == 3 else 3
+        design.update()
+
+    return run
+
+@case('meander', [{'n': 5}, {'n': 50}, {'n': 500}])
+def bench_meander(n):
+
+    def run():
+        gtools.routing.meander(n, 2, 5, 200, 10)
+
+    return run
+
+@case('meanders_batch', [{'count': 10}, {'count': 100}])
+def bench_meanders_batch(count):
+
+    lengths = np.linspace(2000, 8000, count)
+
+    def run():
+        gtools.routing.meanders(lengths, 2, 5, 10, max_width = 200)
+
+    return run
+
+@case('splitter', [{'n': 10}, {'n': 100}, {'n': 1000}])
+def bench_splitter(n):
+
+    def run():
+        gtools.routing.splitter(n, 1, 50, 1)
+
+    return run
+
+@case('splitter_tree', [{'fanouts': [10, 10]}, {'fanouts': [10, 10, 10]}])
+def bench_splitter_tree(fanouts):
+
+    def run():
+        gtools.routing.splitter_tree(fanouts, 1, 50, 1)
+
+    return run
+
+@case('drc', [{'n': 20}, {'n': 50}])
+def bench_drc(n):
+
+    objs = box_grid(n, size = 1.5, pitch = 2)
+
+    def run():
+        drc = gtools.DRC(objs, width = 0.5, space = 1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            drc.check()
+        drc.close()
+
+    return run
+
+@case('drc_incremental', [{'n': 50}, {'n': 100}])
+def bench_drc_incremental(n):
+
+    drc = gtools.DRC(box_grid(n, size = 1.5, pitch = 2), width = 0.5, space = 1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        drc.check()
+    new = gtools.geometry.box((1, 1)).mov((n, n + 0.75))
+    drc.add(new)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            drc.invalidate(new).check()
+
+    return run
+
+@case('flatten', [{'n': 20}, {'n': 40}, {'n': 80}])
+def bench_flatten(n):
+
+    objs = box_grid(n, size = 1.5, pitch = 2)
+
+    def run():
+        gtools.flatten(objs, {'A': (0, 0)}, {'A': None})
+
+    return run
+
+@case('lattice_cutter', [{'n': 25}, {'n': 50}, {'n': 100}])
+def bench_lattice_cutter(n):
+
+    unit = new_cell('UNIT')
+    unit.add(gd.Round((0, 0), 0.3, number_of_points = 32))
+    cutter = gtools.geometry.box((n * 0.6, n * 0.6)).mov((n * 0.2, n * 0.2))
+
+    def run():
+        lat = gtools.lattice(unit, (n, n), (1, 1))
+        gtools.lattice_cutter(lat, cutter)
+
+    return run
+
+@case('add', [{'n': 50}, {'n': 100}, {'n': 200}])
+def bench_add(n):
+
+    objs = box_grid(n)
+
+    def run():
+        gtools.add(new_cell(), objs)
+
+    return run
+
+@case('add_array', [{'n': 50}, {'n': 100}, {'n': 200}])
+def bench_add_array(n):
+
+    pos = np.stack(np.meshgrid(2.0 * np.arange(n), 2.0 * np.arange(n)), axis = -1).reshape(-1, 2)
+
+    def run():
+        arr = gtools.geometry.boxes((1, 1), pos)
+        arr.mov((1, 1))
+        gtools.add(new_cell(), arr)
+
+    return run
+
+@case('add_save', [{'n': 50}, {'n': 100}, {'n': 200}])
+def bench_add_save(n):
+
+    objs = box_grid(n)
+    tmp = tempfile.mkdtemp()
+
+    def run():
+        cell = gtools.add(new_cell(), objs)
+        with contextlib.redirect_stdout(io.StringIO()):
+            gtools.save(cell, os.path.join(tmp, 'bench.gds'))
+
+    return run
+
+@case('wafer', [{'tiles': t, 'workers': w} for t in [8, 32] for w in [1, None]])
+def bench_wafer(tiles, workers):
+
+    pos = gtools.wafer.wafer_map(200 * np.sqrt(tiles), (40, 40))[:tiles]
+    tmp = tempfile.mkdtemp()
+
+    # Fresh tile directory every run, so no tile files are reused
+    def run():
+        wafer = gtools.Wafer(path = tempfile.mkdtemp(dir = tmp))
+        for i, p in enumerate(pos):
+            wafer.add(box_grid, p, n = 20 + i % 4)
+        with contextlib.redirect_stdout(io.StringIO()):
+            wafer.build(os.path.join(tmp, 'wafer.gds'), workers = workers)
+
+    return run
+
+@case('simplify', [{'n': 1000}, {'n': 10000}])
+def bench_simplify(n):
+
+    # Default 100 point circles and routes with one vertex per grid step
+    circles = [gd.Round((0, 0), 5, number_of_points = 100).polygons[0] + (i, 0) for i in range(n // 2)]
+    steps = [(0, y) for y in range(50)] + [(x, 50) for x in range(50)]
+    route = gd.PolyPath(steps, 0.5).polygons
+    routes = [p + (0, i) for i in range(n // 2) for p in route]
+
+    def run():
+        gtools.funcs.simplify_polygons(circles + routes, 0.001)
+
+    return run
+
+#================
+# Timing harness \\
+#=========================================================================
+# Arguments:    fnc     :   callable to time                            ||
+#               repeat  :   number of timed runs                        ||
+#               warmup  :   number of untimed runs before timing        ||
+#=========================================================================
+def measure(fnc, repeat = 5, warmup = 1):
+
+    for i in range(warmup):
+        fnc()
+
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fnc()
+        times.append(time.perf_counter() - t0)
+
+    return {'min': min(times), 'median': float(np.median(times)), 'mean': float(np.mean(times)), 'times': times}
+
+def metadata():
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output = True, text = True, cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'gdspy': gd.__version__,
+    }
+
+def key(result):
+    return result['name'] + '[' + ','.join(str(k) + '=' + str(v) for k, v in sorted(result['params'].items())) + ']'
+
+def run(pattern = None, quick = False, repeat = 5, warmup = 1):
+
+    results = []
+    for c in CASES:
+        if pattern and pattern not in c['name']:
+            continue
+
+        for params in (c['quick'] if quick else c['params']):
+            fnc = c['setup'](**params)
+            result = {'name': c['name'], 'params': params}
+            result.update(measure(fnc, repeat = repeat, warmup = warmup))
+            results.append(result)
+            print('{:<45s} {:>12.3f} ms'.format(key(result), result['median'] * 1e3), flush = True)
+
+    return {'meta': metadata(), 'results': results}
+
+def compare(old, new):
+
+    old_res = {key(r): r for r in old['results']}
+    print('\n{:<45s} {:>12s} {:>12s} {:>8s}'.format('benchmark', 'old (ms)', 'new (ms)', 'ratio'))
+    for r in new['results']:
+        k = key(r)
+        if k not in old_res:
+            continue
+        o = old_res[k]['median']
+        print('{:<45s} {:>12.3f} {:>12.3f} {:>8.2f}'.format(k, o * 1e3, r['median'] * 1e3, r['median'] / o if o else float('nan')))
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(description = 'Run the gds_tools benchmark suite.')
+    parser.add_argument('-k', dest = 'pattern', default = None, help = 'only run cases whose name contains this string')
+    parser.add_argument('-o', '--output', default = 'bench_results.json', help = 'JSON file to write results to')
+    parser.add_argument('-r', '--repeat', type = int, default = 5, help = 'number of timed runs per case')
+    parser.add_argument('--warmup', type = int, default = 1, help = 'number of untimed runs per case')
+    parser.add_argument('--quick', action = 'store_true', help = 'run the smallest workload of each case only')
+    parser.add_argument('--compare', default = None, help = 'earlier JSON result file to compare against')
+    args = parser.parse_args(argv)
+
+    data = run(pattern = args.pattern, quick = args.quick, repeat = args.repeat, warmup = args.warmup)
+
+    with open(args.output, 'w') as f:
+        json.dump(data, f, indent = 2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), data)
+
+    return data
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 # Module definitions
 import copy
-from gds_tools import functions, classes, routing, heal, geometry
+from gds_tools import functions, classes, routing, heal, geometry, spatial, design, cache, query, drc, wafer
 
 # Handy constants
 a = 'A,B,C,D,E,F,G,H,I,J,K,L,M,N,O,P,Q,R,S,T,U,V,W,X,Y,Z'.split(',')
@@ -12,13 +12,23 @@ for i in range(1, 20):
 # Aliases
 GDStructure = classes.GDStructure
 struct = classes.GDStructure
+StructureArray = classes.StructureArray
 instruction_parse = functions.instruction_parse
 add = functions.add
 save = functions.save
 flatten = functions.flatten
+simplify = functions.simplify
 cluster = functions.cluster
 lattice = functions.lattice
 lattice_cutter = functions.lattice_cutter
+label = functions.label
+EndpointIndex = spatial.EndpointIndex
+auto_connect = spatial.auto_connect
+Design = design.Design
+DiskCache = cache.DiskCache
+PolygonIndex = query.PolygonIndex
+DRC = drc.DRC
+Wafer = wafer.Wafer
 
 # Backwards compatibility
 funcs = functions
@@ -0,0 +1,399 @@
+import os
+import io
+import glob
+import inspect
+import hashlib
+import functools
+import numpy as np
+import gdspy as gd
+import gds_tools as gtools
+from recordclass import recordclass
+
+class DiskCache:
+
+    def __init__(self, path = '.gds_cache', max_size = 1e9):
+        """Content-addressed on-disk cache of generated structures and routes
+
+        Args:
+            path (str, optional): directory to store the cache in. Defaults to '.gds_cache'.
+            max_size (float, optional): maximum total size of the cache in bytes, least recently used entries are evicted first. Defaults to 1e9.
+
+        Entries are keyed on the generator (module, name and source code) and its args,
+        routes on the obstacle geometry of the cell, the endpoints and the router parameters.
+        All keys include the source code of gds_tools itself (see code_digest()), so
+        entries made by another version of the package are never returned.
+        Geometry and endpoints are stored as compressed .npz vertex arrays, so everything
+        comes back as gdspy.PolygonSet geometry.
+        """
+
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+
+        os.makedirs(path, exist_ok = True)
+
+    def __contains__(self, key):
+        return os.path.exists(self.filename(key))
+
+    def filename(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    #=================================
+    # Cached call of structure method \\
+    #=========================================================================
+    # Arguments:    method      :   function returning a GDStructure        ||
+    #               **kwargs    :   arguments for method                    ||
+    #=========================================================================
+    def structure(self, method, **kwargs):
+
+        args = bind(method, **kwargs)
+        key = digest('structure', code_digest(), method, args)
+
+        found, s = self.load(key)
+        if found:
+            s.method = method
+            s.__generated__ = list(s.compound)
+            s.__args_tuple__ = recordclass('args', args.keys())
+            s.args = s.__args_tuple__(**args)
+            return s
+
+        s = method(**kwargs)
+        self.store(key, s)
+
+        return s
+
+    #========================
+    # Wrap method with cache \\
+    #=========================================================================
+    # Returns function with the same signature as method, e.g.              ||
+    #   box = cache.wrap(gtools.geometry.box)                               ||
+    #=========================================================================
+    def wrap(self, method):
+
+        @functools.wraps(method)
+        def inner(*args, **kwargs):
+            return self.structure(method, **bind(method, *args, **kwargs))
+
+        return inner
+
+    #=======================
+    # Cached routing.router \\
+    #=========================================================================
+    # Same arguments as routing.router(), the route is looked up by a hash  ||
+    # of the obstacle geometry in cell, the endpoints and the parameters.   ||
+    #=========================================================================
+    def router(self, cell, fr_str, fr_ep, to_str, to_ep, *args, **kwargs):
+
+        params = bind(gtools.routing.router, cell, fr_str, fr_ep, to_str, to_ep, *args, **kwargs)
+        drc = params.pop('drc')
+        for k in ['cell', 'fr_str', 'to_str']:
+            del params[k]
+
+        # Debug output and traced runs are not cached
+        if params.get('debug') or params.pop('trace') is not None:
+            return gtools.routing.router(cell, fr_str, fr_ep, to_str, to_ep, *args, **kwargs)
+
+        ends = [fr_str.endpoints[fr_ep], fr_str.endpoint_dims.get(fr_ep), to_str.endpoints[to_ep], to_str.endpoint_dims.get(to_ep)]
+        key = digest('router', code_digest(), cell_digest(cell), ends, params)
+
+        found, s = self.load(key)
+        if not found:
+            s = gtools.routing.router(cell, fr_str, fr_ep, to_str, to_ep, *args, **kwargs)
+            self.store(key, s)
+            return s
+
+        if s:
+            fr_str.next['AUTOROUTE_A'] = s
+            to_str.next['AUTOROUTE_B'] = s
+            s.prev['AUTOROUTE_A'] = fr_str
+            s.prev['AUTOROUTE_B'] = to_str
+
+            if drc is not None:
+                drc.check([s])
+
+        return s
+
+    #============
+    # Load entry \\
+    #=========================================================================
+    # Returns (found, GDStructure or False)                                 ||
+    #=========================================================================
+    def load(self, key):
+
+        fn = self.filename(key)
+        try:
+            with np.load(fn, allow_pickle = False) as data:
+                s = unpack(data)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return False, None
+
+        # Mark as recently used for eviction
+        os.utime(fn)
+        self.hits += 1
+
+        return True, s
+
+    #=============
+    # Store entry \\
+    #=========================================================================
+    # Arguments:    key         :   cache key                               ||
+    #               structure   :   GDStructure (or False for failed route) ||
+    #=========================================================================
+    def store(self, key, structure):
+
+        try:
+            arrays = pack(structure)
+        except TypeError:
+            return False
+
+        buf = io.BytesIO()
+        np.savez_compressed(buf, **arrays)
+
+        # Write to temporary file first, so concurrent readers never see half an entry
+        fn = self.filename(key)
+        tmp = fn + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(buf.getvalue())
+        os.replace(tmp, fn)
+
+        if self._size is not None:
+            self._size += buf.tell()
+        self.evict()
+
+        return True
+
+    #===================
+    # Evict old entries \\
+    #=========================================================================
+    # Removes least recently used entries until the cache fits in max_size  ||
+    #=========================================================================
+    def evict(self, max_size = None):
+
+        max_size = self.max_size if max_size == None else max_size
+
+        if self._size is not None and self._size <= max_size:
+            return self
+
+        entries = []
+        for fn in glob.glob(os.path.join(self.path, '*.npz')):
+            try:
+                st = os.stat(fn)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, fn))
+
+        self._size = sum(e[1] for e in entries)
+        for mtime, size, fn in sorted(entries):
+            if self._size <= max_size:
+                break
+            try:
+                os.remove(fn)
+            except OSError:
+                continue
+            self._size -= size
+
+        return self
+
+    def clear(self):
+        return self.evict(0)
+
+#==============================
+# Bind arguments with defaults \\
+#=========================================================================
+# Returns dict of all arguments of method, including default values     ||
+#=========================================================================
+def bind(method, *args, **kwargs):
+
+    b = inspect.signature(method).bind(*args, **kwargs)
+    b.apply_defaults()
+
+    return dict(b.arguments)
+
+#========================
+# Hash arbitrary objects \\
+#=========================================================================
+# Builds a sha256 digest of (nested) args: numbers, strings, sequences, ||
+# dicts, numpy arrays, functions, gdspy cells, GDStructures and         ||
+# PolygonIndex objects.                                                 ||
+#=========================================================================
+def digest(*objs):
+
+    h = hashlib.sha256()
+    for o in objs:
+        feed(h, o)
+
+    return h.hexdigest()
+
+def feed(h, o):
+
+    if o is None or isinstance(o, (bool, int, float, complex, str, bytes, np.generic)):
+        h.update(type(o).__name__.encode() + b':' + repr(o).encode() + b';')
+    elif isinstance(o, (list, tuple)):
+        h.update(b'(' + str(len(o)).encode())
+        for i in o:
+            feed(h, i)
+        h.update(b')')
+    elif isinstance(o, dict):
+        h.update(b'{' + str(len(o)).encode())
+        for k in sorted(o, key = repr):
+            feed(h, k)
+            feed(h, o[k])
+        h.update(b'}')
+    elif isinstance(o, np.ndarray):
+        h.update(b'array:' + str(o.dtype).encode() + str(o.shape).encode())
+        h.update(np.ascontiguousarray(o).tobytes())
+    elif isinstance(o, gd.Cell):
+        h.update(b'cell:' + cell_digest(o).encode())
+    elif isinstance(o, gtools.query.PolygonIndex):
+        h.update(b'index:')
+        feed(h, o.edges)
+        feed(h, o.precision)
+    elif isinstance(o, gtools.classes.GDStructure):
+        feed(h, o.endpoints)
+        feed(h, polygons(o.structure))
+    elif callable(o):
+        h.update(b'fnc:' + getattr(o, '__module__', '').encode() + b'.' + getattr(o, '__qualname__', repr(o)).encode())
+        try:
+            h.update(inspect.getsource(o).encode())
+        except (OSError, TypeError):
+            code = getattr(o, '__code__', None)
+            if code is not None:
+                h.update(code.co_code)
+    else:
+        raise TypeError('Cannot hash object of type ' + type(o).__name__ + ' for the cache')
+
+#==========================
+# Digest of gds_tools code \\
+#=========================================================================
+# Hash of the source of every gds_tools module. Generators and the      ||
+# router call into the rest of the package, so any change to it makes   ||
+# new cache keys. Computed once per process.                            ||
+#=========================================================================
+@functools.lru_cache(maxsize = None)
+def code_digest():
+
+    h = hashlib.sha256()
+    for fn in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py'))):
+        h.update(os.path.basename(fn).encode() + b':')
+        with open(fn, 'rb') as f:
+            h.update(f.read())
+
+    return h.hexdigest()
+
+# Digest of all polygons in a cell (and the cells it references), per layer and datatype
+def cell_digest(cell):
+
+    h = hashlib.sha256()
+    polys = cell.get_polygons(by_spec = True)
+    for spec in sorted(polys):
+        feed(h, spec)
+        for p in polys[spec]:
+            feed(h, np.asarray(p, dtype = float))
+
+    return h.hexdigest()
+
+#=====================
+# Structure to arrays \\
+#=========================================================================
+# Flattens the gdspy object(s) of a structure to vertex arrays          ||
+#=========================================================================
+def polygons(structure):
+
+    if type(structure) is type([]):
+        out = [[], [], []]
+        for s in structure:
+            for i, v in enumerate(polygons(s)):
+                out[i] += v
+        return out
+
+    if isinstance(structure, (gd.FlexPath, gd.RobustPath)):
+        structure = structure.to_polygonset()
+
+    if not isinstance(structure, gd.PolygonSet):
+        raise TypeError('Cannot cache geometry of type ' + type(structure).__name__)
+
+    return [list(structure.polygons), list(structure.layers), list(structure.datatypes)]
+
+def pack(structure):
+
+    if structure is False:
+        return {'found': np.array(False)}
+
+    # Instances of an array have no place in the per-structure layout below
+    if isinstance(structure, gtools.classes.StructureArray):
+        raise TypeError('Cannot cache a StructureArray, cache the structure it is made from instead')
+
+    # Root structure first, then its compound members depth-first
+    structs = [structure]
+    parents = [-1]
+    i = 0
+    while i < len(structs):
+        for c in structs[i].compound:
+            structs.append(c)
+            parents.append(i)
+        i += 1
+
+    arrays = {'found': np.array(True), 'parents': np.array(parents, dtype = int)}
+    for i, s in enumerate(structs):
+        polys, layers, datatypes = polygons(s.structure)
+        names = list(s.endpoints.keys())
+
+        arrays['s%d_vertices' % i] = np.concatenate([np.asarray(p, dtype = float) for p in polys]) if polys else np.zeros((0, 2))
+        arrays['s%d_offsets' % i] = np.cumsum([0] + [len(p) for p in polys])
+        arrays['s%d_layers' % i] = np.array(layers, dtype = int)
+        arrays['s%d_datatypes' % i] = np.array(datatypes, dtype = int)
+        arrays['s%d_names' % i] = np.array(names, dtype = str)
+        arrays['s%d_xy' % i] = np.array([s.endpoints[n] for n in names], dtype = float).reshape(-1, 2)
+        arrays['s%d_dims' % i] = np.array([s.endpoint_dims.get(n) if s.endpoint_dims else None for n in names], dtype = float)
+        arrays['s%d_dirs' % i] = np.array([s.endpoint_directions.get(n) for n in names] if s.endpoint_directions != None else [], dtype = float)
+        arrays['s%d_hasdirs' % i] = np.array(s.endpoint_directions != None)
+
+        # Links between a compound member and its parent
+        if parents[i] >= 0:
+            p = structs[parents[i]]
+            links = [('next', k) for k, v in p.next.items() if v is s and isinstance(k, str)]
+            links += [('prev', k) for k, v in p.prev.items() if v is s and isinstance(k, str)]
+            links += [('c_next', k) for k, v in s.next.items() if v is p and isinstance(k, str)]
+            links += [('c_prev', k) for k, v in s.prev.items() if v is p and isinstance(k, str)]
+            arrays['s%d_links' % i] = np.array(links, dtype = str).reshape(-1, 2)
+
+    return arrays
+
+def unpack(data):
+
+    if not data['found']:
+        return False
+
+    structs = []
+    for i, parent in enumerate(data['parents']):
+        v, o = data['s%d_vertices' % i], data['s%d_offsets' % i]
+        polys = [v[o[j]:o[j + 1]] for j in range(len(o) - 1)]
+        geom = gd.PolygonSet(polys)
+        geom.layers = data['s%d_layers' % i].tolist()
+        geom.datatypes = data['s%d_datatypes' % i].tolist()
+
+        names = data['s%d_names' % i].tolist()
+        ends = {n: tuple(xy) for n, xy in zip(names, data['s%d_xy' % i].tolist())}
+        epsz = {n: (None if np.isnan(d) else d) for n, d in zip(names, data['s%d_dims' % i].tolist())}
+        dirs = {n: (None if np.isnan(d) else d) for n, d in zip(names, data['s%d_dirs' % i].tolist())} if data['s%d_hasdirs' % i] else None
+
+        s = gtools.classes.GDStructure(geom, ends, epsz, dirs)
+        structs.append(s)
+
+        if parent >= 0:
+            p = structs[parent]
+            p.compound.append(s)
+            for kind, k in data['s%d_links' % i].tolist():
+                if kind == 'next':
+                    p.next[k] = s
+                elif kind == 'prev':
+                    p.prev[k] = s
+                elif kind == 'c_next':
+                    s.next[k] = p
+                else:
+                    s.prev[k] = p
+
+    return structs[0]
@@ -29,6 +29,9 @@ class GDStructure:
         self.prev = {}
         self.next = {}
         self.method = method
+        self.__indices__ = []
+        self.__transform__ = np.identity(3)
+        self.__generated__ = []
 
         self.__args_tuple__ = recordclass('args', args.keys())
         self.args = self.__args_tuple__(**args)
@@ -37,7 +40,7 @@ class GDStructure:
 
     def generate(self):
         if self.method != None:
-            return self.method(**self.args.__dict__)
+            return self.method(**self.args._asdict())
         else:
             raise TypeError('This GDStructure does not support the .generate() method (yet)')
 
@@ -52,7 +55,8 @@ class GDStructure:
         # Create deepcopy of self and return the copy
         # Do not copy.deepcopy(self) directly, as this will also copy the connections and screw things up
         # Instead, just fill a new instance of the class with copies of relevant internal structure
-        new_obj = gtools.classes.GDStructure(copy.deepcopy(self.structure), copy.deepcopy(self.endpoints), copy.deepcopy(self.endpoint_dims), copy.deepcopy(self.endpoint_directions))
+        new_obj = gtools.classes.GDStructure(copy.deepcopy(self.structure), copy.deepcopy(self.endpoints), copy.deepcopy(self.endpoint_dims), copy.deepcopy(self.endpoint_directions), self.method, self.args._asdict())
+        new_obj.__transform__ = self.__transform__.copy()
 
         compound = []
         for i, c in enumerate(self.compound):
@@ -61,6 +65,7 @@ class GDStructure:
             new_obj.next[i] = c_copy
 
         new_obj.compound = compound
+        new_obj.__generated__ = [compound[i] for i, c in enumerate(self.compound) if any(c is g for g in self.__generated__)]
 
         return new_obj
 
@@ -82,12 +87,14 @@ class GDStructure:
         if self not in signal_from:
             signal_from.append(self)
         self.structure.rotate(rad)
+        self.__transform__ = np.array([[np.cos(rad), -np.sin(rad), 0], [np.sin(rad), np.cos(rad), 0], [0, 0, 1]]).dot(self.__transform__)
 
         # Rotate the endpoints
         for i in self.endpoints:
             self.endpoints[i] = tuple(gtools.funcs.VecRot(rad, self.endpoints[i]))
             if self.endpoint_directions:
                 self.endpoint_directions[i] += rad
+        self.moved()
 
         # Rotate all connected structures
         for i in self.prev:
@@ -102,6 +109,105 @@ class GDStructure:
 
         return self
 
+    #=================
+    # Signal movement \\
+    #=========================================================================
+    # Tells spatial indices containing this structure that its endpoints    ||
+    # have changed. Called by the transforms, call it yourself after        ||
+    # editing self.endpoints by hand.                                       ||
+    #=========================================================================
+    def moved(self):
+
+        for index in self.__indices__:
+            index.invalidate(self)
+
+        return self
+
+    #=================
+    # Apply transform \\
+    #=========================================================================
+    # Applies a 3x3 affine matrix (rotation, mirroring and translation      ||
+    # only, as tracked in self.__transform__) using the transforms above.   ||
+    #=========================================================================
+    def apply(self, transform, signal_from = None):
+
+        t = np.array(transform, dtype = float)
+
+        if np.linalg.det(t[:2, :2]) < 0:
+            self.mirror((0, 0), (1, 0), signal_from = signal_from)
+            t = t.dot(np.diag([1, -1, 1]))
+
+        rad = np.arctan2(t[1, 0], t[0, 0])
+        if rad != 0:
+            self.rotate(rad, signal_from = signal_from)
+        if t[0, 2] != 0 or t[1, 2] != 0:
+            self.translate((t[0, 2], t[1, 2]), signal_from = signal_from)
+
+        return self
+
+    #======================
+    # Regenerate structure \\
+    #=========================================================================
+    # Rebuilds the structure from self.method and self.args (e.g. after     ||
+    # self.args.n = 5) and puts the new geometry in the place of the old.   ||
+    # Structures connected at an endpoint that moved are translated along,  ||
+    # everything else is left untouched. Compound members made by method    ||
+    # are replaced by the compound of the new structure. Members added      ||
+    # later (e.g. by .heal()) are kept and moved along with the endpoint    ||
+    # they sit on, members on none of the endpoints stay where they are.    ||
+    #=========================================================================
+    def regenerate(self):
+
+        new = self.generate()
+        new.apply(self.__transform__)
+
+        old_ends = self.endpoints
+        old_compound = [c for c in self.compound if any(c is g for g in self.__generated__)]
+        kept = [c for c in self.compound if not any(c is g for g in self.__generated__)]
+
+        # Drop links to the old compound members, adopt the new ones
+        for links in [self.prev, self.next]:
+            for k in [k for k, v in links.items() if any(v is c for c in old_compound)]:
+                del links[k]
+
+        for k, v in new.next.items():
+            self.next[k] = v
+            for pk in [pk for pk, pv in v.prev.items() if pv is new]:
+                v.prev[pk] = self
+
+        self.structure = new.structure
+        self.endpoints = new.endpoints
+        self.endpoint_dims = new.endpoint_dims
+        self.endpoint_directions = new.endpoint_directions
+        self.compound = new.compound + kept
+        self.__generated__ = list(new.compound)
+        self.__transform__ = new.__transform__
+        self.moved()
+
+        # Added members follow the endpoint they were placed on
+        for c in kept:
+            on = [k for k, xy in old_ends.items() if k in self.endpoints and any(np.allclose(xy, p) for p in c.endpoints.values())]
+            if not on:
+                print('>> Warning: compound member of regenerated structure is not on any of its endpoints, it is left in place.')
+                continue
+
+            delta = tuple(map(sub, self.endpoints[on[0]], old_ends[on[0]]))
+            if delta != (0, 0):
+                c.translate(delta, signal_from = [self])
+
+        # Move neighbours along with the endpoints they are connected to
+        signal_from = [self] + self.compound
+        for links in [self.prev, self.next]:
+            for k, v in list(links.items()):
+                if k not in old_ends or k not in self.endpoints or v in signal_from:
+                    continue
+
+                delta = tuple(map(sub, self.endpoints[k], old_ends[k]))
+                if delta != (0, 0):
+                    v.translate(delta, signal_from = signal_from)
+
+        return self
+
     #=====================
     # Get structure layer \\
     #=========================================================================
@@ -127,10 +233,12 @@ class GDStructure:
         if self not in signal_from:
             signal_from.append(self)
         self.structure.translate(delta[0], delta[1])
+        self.__transform__ = np.array([[1, 0, delta[0]], [0, 1, delta[1]], [0, 0, 1]]).dot(self.__transform__)
 
         # Translate all the endpoints
         for i in self.endpoints:
             self.endpoints[i] = tuple(map(add, self.endpoints[i], delta))
+        self.moved()
 
         # Translate all connected structures
         for i in self.prev:
@@ -145,7 +253,7 @@ class GDStructure:
 
         return self
 
-    #=====================
+    #==================
     # Mirror structure \\
     #=========================================================================
     # Arguments:    p1, p2  :   p1 and p2 are (x, y) coords forming         ||
@@ -161,6 +269,15 @@ class GDStructure:
             signal_from.append(self)
         self.structure.mirror(p1, p2 = p2)
 
+        # Reflection about the line through p1 and p2
+        u = np.array(p2, dtype = float) - np.array(p1, dtype = float)
+        u /= np.linalg.norm(u)
+        ref = 2 * np.outer(u, u) - np.identity(2)
+        m = np.identity(3)
+        m[:2, :2] = ref
+        m[:2, 2] = np.array(p1) - ref.dot(p1)
+        self.__transform__ = m.dot(self.__transform__)
+
         # Process the endpoints
         for k, v in self.endpoints.items():
 
@@ -182,6 +299,7 @@ class GDStructure:
             v2y = 2*d*a - v[1] + 2*c
 
             self.endpoints[k] = (v2x, v2y)
+        self.moved()
 
         # Ripple through all connected shapes
         for i in self.prev:
@@ -217,6 +335,20 @@ class GDStructure:
 
         return self
 
+    #====================
+    # Simplify structure \\
+    #=========================================================================
+    # Merges collinear points and reduces curves, see functions.simplify()  ||
+    #                                                                       ||
+    # Arguments:    tolerance   :   maximum deviation from the outline      ||
+    #    (optional) compound    :   also simplify compound structures       ||
+    #=========================================================================
+    def simplify(self, tolerance = 0.001, compound = True, verbose = True):
+
+        gtools.funcs.simplify(self, tolerance = tolerance, compound = compound, verbose = verbose)
+
+        return self
+
     #===================
     # Connect structure \\
     #=========================================================================
@@ -275,3 +407,283 @@ class GDStructure:
     mov = translate
     con = connect
     dis = disconnect
+    regen = regenerate
+
+class StructureArray:
+
+    def __init__(self, vertices, endpoints, endpoint_dims, endpoint_directions = None, layer = 0, datatype = 0):
+        """Define class to store N instances of a single-polygon structure in as stacked arrays
+
+        Args:
+            vertices (numpy.ndarray): (N, V, 2) polygon vertices of every instance.
+            endpoints (dict): positions of the endpoints, (N, 2) array per endpoint name.
+            endpoint_dims (dict): dimensions of the endpoints, (N,) array (or scalar) per endpoint name.
+            endpoint_directions (dict, optional): directions of the endpoints, (N,) array per endpoint name. Defaults to None.
+            layer (int, optional): layer of all instances. Defaults to 0.
+            datatype (int, optional): datatype of all instances. Defaults to 0.
+
+        arr.endpoints['A'][i] is endpoint A of instance i, arr[i] can be used as target
+        of GDStructure.connect(). Transforms work on all instances at once and move
+        everything that is connected to any of the instances along.
+        """
+
+        self.type = 'StructureArray'
+        self.vertices = np.asarray(vertices, dtype = float)
+        n = len(self.vertices)
+
+        self.endpoints = {k: np.asarray(v, dtype = float).reshape(n, 2) for k, v in endpoints.items()}
+        self.endpoint_dims = {k: np.broadcast_to(np.asarray(v if v is not None else np.nan, dtype = float), (n,)).copy() for k, v in endpoint_dims.items()}
+        self.endpoint_directions = {k: np.broadcast_to(np.asarray(v, dtype = float), (n,)).copy() for k, v in endpoint_directions.items()} if endpoint_directions else None
+        self.layer = layer
+        self.datatype = datatype
+        self.compound = []
+        self.prev = {}
+        self.next = {}
+        self.__indices__ = []
+
+        self._views = {}
+        self._structure = None
+
+    def __len__(self):
+        return len(self.vertices)
+
+    def __getitem__(self, i):
+
+        i = int(i) % len(self)
+        if i not in self._views:
+            self._views[i] = StructureView(self, i)
+
+        return self._views[i]
+
+    #============================
+    # Polygons as one PolygonSet \\
+    #=========================================================================
+    # Built on first use, so adding the array to a cell adds a single       ||
+    # PolygonSet instead of N gdspy objects. Transforms update it in place, ||
+    # like the gdspy object of a GDStructure, so cells it is in follow.     ||
+    #=========================================================================
+    @property
+    def structure(self):
+
+        if self._structure is None:
+            self._structure = gdspy.PolygonSet(list(self.vertices), layer = self.layer, datatype = self.datatype)
+
+        return self._structure
+
+    def getlayer(self):
+        return self.layer
+
+    def copy(self):
+
+        ends = {k: v.copy() for k, v in self.endpoints.items()}
+        dims = {k: v.copy() for k, v in self.endpoint_dims.items()}
+        dirs = {k: v.copy() for k, v in self.endpoint_directions.items()} if self.endpoint_directions else None
+
+        return StructureArray(self.vertices.copy(), ends, dims, dirs, self.layer, self.datatype)
+
+    # Pass a transform on to everything connected to the array or one of its instances
+    def _ripple(self, transform, signal_from):
+
+        links = [self.prev, self.next]
+        for i, v in self._views.items():
+            links += [v.prev, v.next]
+
+        for l in links:
+            for k in l:
+                if l[k] not in signal_from:
+                    signal_from.append(l[k])
+                    transform(l[k])
+
+    def moved(self):
+
+        if self._structure is not None:
+            self._structure.polygons = list(self.vertices)
+
+        for index in self.__indices__:
+            index.invalidate(self)
+
+        return self
+
+    #=====================
+    # Translate instances \\
+    #=========================================================================
+    # Arguments:    delta       :   (x, y) or (N, 2) array, per instance    ||
+    #               signal_from :   tells linked structure who sent command ||
+    #=========================================================================
+    def translate(self, delta, signal_from = None):
+
+        if not isinstance(signal_from, list):
+            signal_from = [signal_from]
+        if self not in signal_from:
+            signal_from.append(self)
+
+        delta = np.asarray(delta, dtype = float)
+        d = delta.reshape(-1, 1, 2) if delta.ndim == 2 else delta
+        self.vertices += d
+        for k in self.endpoints:
+            self.endpoints[k] += delta
+        self.moved()
+
+        # Instances moved by different amounts only drag along what is connected to them
+        if delta.ndim == 2:
+            for i, v in self._views.items():
+                for l in [v.prev, v.next]:
+                    for k in l:
+                        if l[k] not in signal_from:
+                            signal_from.append(l[k])
+                            l[k].translate(tuple(delta[i]), signal_from = signal_from)
+        else:
+            self._ripple(lambda s: s.translate(tuple(delta), signal_from = signal_from), signal_from)
+
+        return self
+
+    #==================
+    # Rotate instances \\
+    #=========================================================================
+    # Arguments:    rad         :   radians, scalar or (N,) per instance    ||
+    #    (optional) origin      :   (x, y) or (N, 2) rotation centres       ||
+    #               signal_from :   tells linked structure who sent command ||
+    #=========================================================================
+    def rotate(self, rad, origin = (0, 0), signal_from = None):
+
+        if not isinstance(signal_from, list):
+            signal_from = [signal_from]
+        if self not in signal_from:
+            signal_from.append(self)
+
+        n = len(self)
+        rad_i = np.broadcast_to(np.asarray(rad, dtype = float), (n,))
+        o = np.broadcast_to(np.asarray(origin, dtype = float), (n, 2))
+        c, s = np.cos(rad_i), np.sin(rad_i)
+        rot = np.stack([np.stack([c, -s], axis = 1), np.stack([s, c], axis = 1)], axis = 1)
+
+        self.vertices = np.einsum('nij,nvj->nvi', rot, self.vertices - o[:, None, :]) + o[:, None, :]
+        for k in self.endpoints:
+            self.endpoints[k] = np.einsum('nij,nj->ni', rot, self.endpoints[k] - o) + o
+            if self.endpoint_directions:
+                self.endpoint_directions[k] += rad_i
+        self.moved()
+
+        # Only a rotation of the whole array about the origin is passed on
+        if np.ndim(rad) == 0 and np.ndim(origin) == 1 and not np.any(origin):
+            self._ripple(lambda st: st.rotate(rad, signal_from = signal_from), signal_from)
+
+        return self
+
+    #==================
+    # Mirror instances \\
+    #=========================================================================
+    # Arguments:    p1, p2  :   p1 and p2 are (x, y) coords forming         ||
+    #                           the mirror line                             ||
+    #=========================================================================
+    def mirror(self, p1, p2, signal_from = None):
+
+        if not isinstance(signal_from, list):
+            signal_from = [signal_from]
+        if self not in signal_from:
+            signal_from.append(self)
+
+        p1 = np.asarray(p1, dtype = float)
+        u = np.asarray(p2, dtype = float) - p1
+        u /= np.linalg.norm(u)
+        ref = 2 * np.outer(u, u) - np.identity(2)
+
+        self.vertices = (self.vertices - p1).dot(ref.T) + p1
+        for k in self.endpoints:
+            self.endpoints[k] = (self.endpoints[k] - p1).dot(ref.T) + p1
+        self.moved()
+
+        self._ripple(lambda s: s.mirror(tuple(p1), tuple(p2), signal_from = signal_from), signal_from)
+
+        return self
+
+    #==============================
+    # Replicate a single structure \\
+    #=========================================================================
+    # Arguments:    structure   :   GDStructure with a single polygon       ||
+    #               positions   :   (N, 2) offsets of the copies            ||
+    #=========================================================================
+    @staticmethod
+    def tile(structure, positions):
+
+        polys = structure.structure.polygons if hasattr(structure.structure, 'polygons') else []
+        if len(polys) != 1:
+            raise ValueError('StructureArray.tile() needs a structure consisting of exactly one polygon')
+
+        pos = np.asarray(positions, dtype = float).reshape(-1, 2)
+        verts = polys[0][None, :, :] + pos[:, None, :]
+        ends = {k: np.asarray(v, dtype = float) + pos for k, v in structure.endpoints.items()}
+        dirs = structure.endpoint_directions if structure.endpoint_directions else None
+
+        return StructureArray(verts, ends, structure.endpoint_dims, dirs, layer = structure.getlayer(), datatype = structure.structure.datatypes[0])
+
+    # Aliases
+    rot = rotate
+    mov = translate
+
+class StructureView:
+
+    def __init__(self, array, index):
+        """Single instance of a StructureArray, usable as target of GDStructure.connect()
+
+        Args:
+            array (StructureArray): array the instance belongs to.
+            index (int): index of the instance.
+
+        Moving the instance moves the whole array (and everything connected to it).
+        """
+
+        self.type = 'StructureView'
+        self.array = array
+        self.index = index
+        self.compound = []
+        self.prev = {}
+        self.next = {}
+
+    @property
+    def endpoints(self):
+        return {k: tuple(v[self.index]) for k, v in self.array.endpoints.items()}
+
+    @property
+    def endpoint_dims(self):
+        return {k: (None if np.isnan(v[self.index]) else float(v[self.index])) for k, v in self.array.endpoint_dims.items()}
+
+    @property
+    def endpoint_directions(self):
+        if self.array.endpoint_directions is None:
+            return None
+        return {k: float(v[self.index]) for k, v in self.array.endpoint_directions.items()}
+
+    def getlayer(self):
+        return self.array.layer
+
+    def translate(self, delta, signal_from = None):
+
+        if not isinstance(signal_from, list):
+            signal_from = [signal_from]
+        if self.array not in signal_from:
+            self.array.translate(delta, signal_from = signal_from)
+
+        return self
+
+    def rotate(self, rad, signal_from = None):
+
+        if not isinstance(signal_from, list):
+            signal_from = [signal_from]
+        if self.array not in signal_from:
+            self.array.rotate(rad, signal_from = signal_from)
+
+        return self
+
+    def mirror(self, p1, p2, signal_from = None):
+
+        if not isinstance(signal_from, list):
+            signal_from = [signal_from]
+        if self.array not in signal_from:
+            self.array.mirror(p1, p2, signal_from = signal_from)
+
+        return self
+
+    # Aliases
+    rot = rotate
+    mov = translate
@@ -0,0 +1,170 @@
+import numpy as np
+import gds_tools as gtools
+
+class Design:
+
+    def __init__(self, objectlist = None, cell = None):
+        """Design graph that regenerates only the structures whose args changed
+
+        Args:
+            objectlist (list, optional): GDStructure objects that make up the design. Defaults to None.
+            cell (gdspy.Cell, optional): cell to place the design in, kept up to date by .update(). Defaults to None.
+
+        Change a parameter with design.set(structure, n = 5) (or structure.args.n = 5)
+        and call design.update(). Only the changed structures are rebuilt with their
+        .method, connected neighbours are moved along with the endpoints they are
+        connected to and the geometry of all other structures is reused as is.
+        """
+
+        self.structures = []
+        self.cell = None
+
+        self._args = {}
+        self._objects = {}
+        self._dirty = set()
+
+        if objectlist:
+            self.add(objectlist)
+
+        if cell is not None:
+            self.build(cell)
+
+    def __contains__(self, structure):
+        return id(structure) in self._args
+
+    #================
+    # Add structures \\
+    #=========================================================================
+    # Arguments:    objectlist  :   GDStructure or list of GDStructures     ||
+    #=========================================================================
+    def add(self, objectlist):
+
+        if type(objectlist) is not type([]):
+            objectlist = [objectlist]
+
+        for i in objectlist:
+            if i in self:
+                continue
+
+            self.structures.append(i)
+            self._args[id(i)] = i.args._asdict()
+
+            if self.cell is not None:
+                self._place(i)
+
+        return self
+
+    #===============================
+    # Change arguments of structure \\
+    #=========================================================================
+    # Arguments:    structure   :   GDStructure in the design               ||
+    #               **kwargs    :   new values for structure.args           ||
+    #=========================================================================
+    def set(self, structure, **kwargs):
+
+        for k, v in kwargs.items():
+            if k not in structure.args._asdict():
+                raise KeyError('\'' + k + '\' is not an argument of ' + str(structure.method))
+            setattr(structure.args, k, v)
+
+        return self
+
+    #=================================
+    # Mark structure for regeneration \\
+    #=========================================================================
+    # For changes that are not visible in args, e.g. a module level         ||
+    # constant used by the generator.                                       ||
+    #=========================================================================
+    def invalidate(self, structure):
+
+        self._dirty.add(id(structure))
+
+        return self
+
+    #=========================
+    # Find changed structures \\
+    #=========================================================================
+    # Compares the current args of every structure with those it was last   ||
+    # generated with.                                                       ||
+    #=========================================================================
+    def changed(self):
+
+        out = []
+        for s in self.structures:
+            if id(s) in self._dirty or not equal(s.args._asdict(), self._args[id(s)]):
+                out.append(s)
+
+        return out
+
+    #===================
+    # Update the design \\
+    #=========================================================================
+    # Regenerates the changed structures in place, moves their neighbours   ||
+    # and swaps their geometry in the cell (if any).                        ||
+    #                                                                       ||
+    # Returns list of regenerated structures                                ||
+    #=========================================================================
+    def update(self):
+
+        changed = self.changed()
+
+        for s in changed:
+            if self.cell is not None:
+                self._remove(s)
+
+            s.regenerate()
+            self._args[id(s)] = s.args._asdict()
+            self._dirty.discard(id(s))
+
+            if self.cell is not None:
+                self._place(s)
+
+        # Moved neighbours were translated in place, only the cached bounding box is stale
+        if changed and self.cell is not None and hasattr(self.cell, '_bb_valid'):
+            self.cell._bb_valid = False
+
+        return changed
+
+    #======================
+    # Place design in cell \\
+    #=========================================================================
+    # Arguments:    cell    :   gdspy cell object                           ||
+    #=========================================================================
+    def build(self, cell):
+
+        self.cell = cell
+        for s in self.structures:
+            self._place(s)
+
+        return cell
+
+    # Add the gdspy objects of a structure to the cell, remembering which ones they are
+    def _place(self, structure):
+
+        n_poly, n_path = len(self.cell.polygons), len(self.cell.paths)
+        gtools.add(self.cell, structure)
+        self._objects[id(structure)] = [id(o) for o in self.cell.polygons[n_poly:] + self.cell.paths[n_path:]]
+
+    def _remove(self, structure):
+
+        ids = set(self._objects.pop(id(structure), []))
+        self.cell.polygons = [o for o in self.cell.polygons if id(o) not in ids]
+        self.cell.paths = [o for o in self.cell.paths if id(o) not in ids]
+
+# Compare two args dicts, also when they contain numpy arrays
+def equal(a, b):
+
+    if a.keys() != b.keys():
+        return False
+
+    for k in a:
+        if a[k] is b[k]:
+            continue
+        try:
+            if not np.array_equal(a[k], b[k]):
+                return False
+        except (TypeError, ValueError):
+            if a[k] != b[k]:
+                return False
+
+    return True
@@ -0,0 +1,634 @@
+import numpy as np
+import gdspy as gd
+import scipy.spatial as sp
+import gds_tools as gtools
+
+# Edges of the same polygon only count as facing within 45 degrees of their normals
+FACING = np.cos(np.pi / 4) + 1e-9
+
+# Per edge data kept in the KD-tree blocks
+FIELDS = ['edges', 'eid', 'unit', 'version', 'poly', 'vertex', 'size']
+
+class DRC:
+
+    def __init__(self, objectlist = None, width = None, space = None, overlap = True, marker_layer = 255, precision = 0.001, compound = True):
+        """Incremental design rule checker for minimum width, minimum spacing and overlaps
+
+        Args:
+            objectlist (list, optional): GDStructure objects to check. Defaults to None.
+            width (float or dict, optional): minimum width, for all layers or as {layer: width}. Defaults to None (not checked).
+            space (float or dict, optional): minimum spacing, for all layers or as {layer: space}. Defaults to None (not checked).
+            overlap (bool, optional): report overlaps between structures that are not connected to each other. Defaults to True.
+            marker_layer (int, optional): layer of the violation markers, datatype 0 for width, 1 for spacing, 2 for overlap. Defaults to 255.
+            precision (float, optional): precision used for merging the polygons of a structure. Defaults to 0.001.
+            compound (bool, optional): also check the members of compound structures, like functions.add() places them. Defaults to True.
+
+        The polygons of each structure are merged per layer and their edges are kept
+        in a KD-tree of edge samples per layer. .check() only looks at structures that
+        were added or moved since the last check: their edges against each other and
+        against everything else, so it is cheap enough to run after every router() call.
+        Violations are returned as GDStructures on the marker layer with endpoints 'A'
+        and 'B' at the closest points and .prev linking to the offending structures.
+        Call .close() on a checker that is no longer used, otherwise its structures keep
+        notifying it on every transform.
+        """
+
+        self.width = width
+        self.space = space
+        self.overlap = overlap
+        self.marker_layer = marker_layer
+        self.precision = precision
+        self.compound = compound
+        self.structures = []
+
+        self._uid = {}
+        self._objs = []
+        self._version = np.zeros(0, dtype = int)
+        self._shapes = []
+        self._boxes = {}
+        self._dirty = set()
+        self._forests = {}
+        self._found = {}
+        self._involved = {}
+
+        if objectlist:
+            self.add(objectlist)
+
+    def __contains__(self, structure):
+        return id(structure) in self._uid and self._version[self._uid[id(structure)]] >= 0
+
+    # All current violations, in the order they were found
+    @property
+    def violations(self):
+        return list(self._found.values())
+
+    # Rule value for a layer, None if not checked
+    def rule(self, kind, layer):
+
+        value = self.width if kind == 'width' else self.space
+        if type(value) is type({}):
+            return value.get(layer)
+
+        return value
+
+    #================
+    # Add structures \\
+    #=========================================================================
+    # Arguments:    objectlist  :   GDStructure or list of GDStructures     ||
+    #=========================================================================
+    def add(self, objectlist):
+
+        if type(objectlist) is not type([]):
+            objectlist = [objectlist]
+
+        for i in objectlist:
+            if i in self:
+                continue
+
+            # Removed structures keep counting versions, so their old edges stay outdated
+            if id(i) in self._uid:
+                u = self._uid[id(i)]
+                self._version[u] = -1 - self._version[u]
+            else:
+                u = len(self._objs)
+                self._uid[id(i)] = u
+                self._objs.append(i)
+                self._shapes.append({})
+                self._version = np.append(self._version, 0)
+
+            self.structures.append(i)
+            self._dirty.add(u)
+            i.__indices__.append(self)
+
+            if self.compound and i.compound:
+                self.add(i.compound)
+
+        return self
+
+    #===================
+    # Remove structures \\
+    #=========================================================================
+    # Arguments:    objectlist  :   GDStructure or list of GDStructures     ||
+    #=========================================================================
+    def remove(self, objectlist):
+
+        if type(objectlist) is not type([]):
+            objectlist = [objectlist]
+
+        gone = set()
+        for i in objectlist:
+            if i not in self:
+                continue
+
+            u = self._uid[id(i)]
+            gone.add(u)
+            self._version[u] = -1 - self._version[u]
+            self._shapes[u] = {}
+            self._dirty.discard(u)
+            i.__indices__.remove(self)
+
+        self.structures = [s for s in self.structures if self._uid[id(s)] not in gone]
+        self._forget(gone)
+
+        return self
+
+    #===============
+    # Stop tracking \\
+    #=========================================================================
+    # Detaches the checker from all its structures, so their transforms no  ||
+    # longer notify it. .violations is kept, later changes are not seen     ||
+    # until the structures are add()'ed again.                              ||
+    #=========================================================================
+    def close(self):
+
+        for i in self.structures:
+            u = self._uid[id(i)]
+            self._version[u] = -1 - self._version[u]
+            self._shapes[u] = {}
+            i.__indices__.remove(self)
+
+        self.structures = []
+        self._dirty = set()
+
+        return self
+
+    #===========================
+    # Mark structure as changed \\
+    #=========================================================================
+    # Called by GDStructure.moved(), the structure is checked again on the  ||
+    # next .check().                                                        ||
+    #=========================================================================
+    def invalidate(self, structure):
+
+        self._dirty.add(self._uid[id(structure)])
+
+        return self
+
+    #==================
+    # Run design rules \\
+    #=========================================================================
+    # Checks all structures that were added or changed since the last call. ||
+    #                                                                       ||
+    # Arguments:    (optional) objectlist   :   structures to add first     ||
+    #                          full         :   check every structure again ||
+    #                                                                       ||
+    # Returns list of new violations, all current ones are in .violations   ||
+    #=========================================================================
+    def check(self, objectlist = None, full = False):
+
+        if objectlist:
+            self.add(objectlist)
+
+        if full:
+            self._dirty |= {self._uid[id(s)] for s in self.structures}
+
+        dirty = np.array(sorted(self._dirty), dtype = int)
+        self._dirty = set()
+        if len(dirty) == 0:
+            return []
+
+        # Old results of the changed structures are replaced by new ones
+        self._forget(dirty)
+
+        self._version[dirty] += 1
+        for u in dirty:
+            self._shapes[u] = shapes(self._objs[u].structure, self.precision)
+
+        layers = sorted({l for u in dirty for l in self._shapes[u]})
+        self._update_boxes(dirty, layers)
+
+        found = []
+        for layer in layers:
+            found += self._check_edges(layer, dirty)
+            if self.overlap:
+                found += self._check_overlap(layer, dirty)
+
+        for v in found:
+            self._found[id(v)] = v
+            for s in v.prev.values():
+                self._involved.setdefault(self._uid[id(s)], []).append(id(v))
+
+        if found:
+            counts = {}
+            for v in found:
+                counts[v.args.rule] = counts.get(v.args.rule, 0) + 1
+            print('>> DRC: ' + str(len(found)) + ' violation(s), ' + ', '.join(k + ': ' + str(n) for k, n in counts.items()))
+
+        return found
+
+    # Drop violations involving any of the given structures
+    def _forget(self, units):
+
+        for u in units:
+            for k in self._involved.pop(u, []):
+                self._found.pop(k, None)
+
+    # Width and spacing of the changed structures, against each other and all other edges on the layer
+    def _check_edges(self, layer, dirty):
+
+        width, space = self.rule('width', layer), self.rule('space', layer)
+        r = max(width or 0, space or 0)
+        if r <= 0:
+            return []
+
+        forest = self._forests.setdefault(layer, EdgeForest(r))
+        block = forest.block([(u, self._version[u], self._shapes[u].get(layer, [])) for u in dirty])
+
+        # Edge pairs with samples within r + h of each other, h = r
+        pa = block.tree.query_pairs(2 * r, output_type = 'ndarray').reshape(-1, 2)
+        sides = [(block.take(block.sample_edge[pa[:, 0]]), block.take(block.sample_edge[pa[:, 1]]))]
+        for other in forest.blocks:
+            hits = block.tree.query_ball_tree(other.tree, 2 * r)
+            n = np.array([len(h) for h in hits], dtype = int)
+            if n.sum() == 0:
+                continue
+            ia = block.sample_edge[np.repeat(np.arange(len(hits)), n)]
+            ib = other.sample_edge[np.concatenate(hits).astype(int)]
+            ab = np.unique(ia * len(other.edges) + ib)
+            ia, ib = ab // len(other.edges), ab % len(other.edges)
+            sides.append((block.take(ia), other.take(ib)))
+
+        forest.insert(block, self._version)
+
+        a = {k: np.concatenate([x[0][k] for x in sides]) for k in sides[0][0]}
+        b = {k: np.concatenate([x[1][k] for x in sides]) for k in sides[0][1]}
+
+        # Drop duplicates of pairs within the new block and outdated edges
+        keep = (a['version'] == self._version[a['unit']]) & (b['version'] == self._version[b['unit']])
+        keep &= a['eid'] != b['eid']
+        key = np.minimum(a['eid'], b['eid']) * (forest.count + 1) + np.maximum(a['eid'], b['eid'])
+        _, first = np.unique(key[keep], return_index = True)
+        rows = np.flatnonzero(keep)[first]
+        a = {k: v[rows] for k, v in a.items()}
+        b = {k: v[rows] for k, v in b.items()}
+
+        return self._classify(layer, a, b, width, space)
+
+    def _classify(self, layer, a, b, width, space):
+
+        p1, p2, d = segment_closest(a['edges'], b['edges'])
+
+        # Skip neighbouring edges of one polygon and edges that touch or cross
+        same = a['poly'] == b['poly']
+        n = a['size']
+        dv = (a['vertex'] - b['vertex']) % n
+        keep = ~(same & ((dv == 1) | (dv == n - 1))) & (d > self.precision / 2)
+        a = {k: v[keep] for k, v in a.items()}
+        b = {k: v[keep] for k, v in b.items()}
+        p1, p2, d, same = p1[keep], p2[keep], d[keep], same[keep]
+
+        # Outward normals (polygons are counter-clockwise) against direction of the gap
+        v = (p2 - p1) / d[:, None]
+        c1 = (v * normal(a['edges'])).sum(axis = 1)
+        c2 = (v * normal(b['edges'])).sum(axis = 1)
+        lim = np.where(same, FACING, 1e-9)
+
+        out = []
+        if width:
+            w = same & (c1 < -lim) & (c2 > lim) & (d < width - self.precision / 2)
+            out += self._markers('width', layer, width, a['unit'][w], b['unit'][w], p1[w], p2[w], d[w])
+
+        if space:
+            s = (c1 > lim) & (c2 < -lim) & (d < space - self.precision / 2)
+
+            # The gap has to be empty, not filled by another structure
+            if s.any():
+                rows = np.flatnonzero(s)
+                units = set(a['unit'][rows].tolist()) | set(b['unit'][rows].tolist())
+                s[rows[self._filled(layer, (p1[rows] + p2[rows]) / 2, space, units)]] = False
+
+            out += self._markers('space', layer, space, a['unit'][s], b['unit'][s], p1[s], p2[s], d[s])
+
+        return out
+
+    # Which points lie inside any structure on the layer that has edges near them
+    def _filled(self, layer, points, r, units):
+
+        for block in self._forests[layer].blocks:
+            for hits in block.tree.query_ball_point(points, 2 * r):
+                units.update(block.unit[block.sample_edge[hits]].tolist())
+
+        polys = [p for u in units if self._version[u] >= 0 for p in self._shapes[u].get(layer, [])]
+
+        return gtools.query.PolygonIndex(polys, precision = None).inside(points)
+
+    def _markers(self, rule, layer, limit, ua, ub, p1, p2, d):
+
+        if len(ua) == 0:
+            return []
+
+        # One marker per pair of closest points
+        key = np.round(np.concatenate([np.minimum(p1, p2), np.maximum(p1, p2)], axis = 1) / self.precision).astype(np.int64)
+        _, first = np.unique(key, axis = 0, return_index = True)
+
+        out = []
+        g = limit / 4
+        for k in sorted(first):
+            lo, hi = np.minimum(p1[k], p2[k]) - g, np.maximum(p1[k], p2[k]) + g
+            rect = gd.Rectangle(tuple(lo), tuple(hi), layer = self.marker_layer, datatype = 0 if rule == 'width' else 1)
+            out.append(marker(rect, p1[k], p2[k], self._objs[ua[k]], self._objs[ub[k]], rule, float(d[k]), limit, layer))
+
+        return out
+
+    # Bounding boxes of all structures per layer, NaN where a structure has nothing on the layer
+    def _update_boxes(self, dirty, layers):
+
+        for layer in set(layers) | set(self._boxes):
+            boxes = self._boxes.get(layer, np.zeros((0, 4)))
+            if len(boxes) < len(self._objs):
+                boxes = np.concatenate([boxes, np.full((len(self._objs) - len(boxes), 4), np.nan)])
+
+            boxes[dirty] = np.nan
+            rows = [u for u in dirty if layer in self._shapes[u]]
+            if rows:
+                polys = [np.concatenate(self._shapes[u][layer]) for u in rows]
+                start = np.cumsum([len(p) for p in polys]) - [len(p) for p in polys]
+                v = np.concatenate(polys)
+                boxes[rows] = np.concatenate([np.minimum.reduceat(v, start), np.maximum.reduceat(v, start)], axis = 1)
+
+            boxes[self._version < 0] = np.nan
+            self._boxes[layer] = boxes
+
+    # Overlapping polygons of changed structures with structures they are not connected to
+    def _check_overlap(self, layer, dirty):
+
+        boxes = self._boxes[layer]
+        rows = np.array([u for u in dirty if layer in self._shapes[u]], dtype = int)
+        ua, ub = box_pairs(boxes, rows)
+
+        out = []
+        for u, o in zip(ua.tolist(), ub.tolist()):
+            if linked(self._objs[u], self._objs[o]):
+                continue
+
+            res = gd.boolean(self._shapes[u][layer], self._shapes[o][layer], 'and', precision = self.precision, layer = self.marker_layer, datatype = 2)
+            if res is None or res.area() <= self.precision**2:
+                continue
+
+            bb = res.get_bounding_box()
+            c = (bb[0] + bb[1]) / 2
+            out.append(marker(res, c, c, self._objs[u], self._objs[o], 'overlap', float(res.area()), 0, layer))
+
+        return out
+
+class EdgeBlock:
+
+    def __init__(self, edges, eid, unit, version, poly, vertex, size, h):
+
+        self.edges = edges
+        self.eid = eid
+        self.unit = unit
+        self.version = version
+        self.poly = poly
+        self.vertex = vertex
+        self.size = size
+
+        # Samples at most h apart along every edge
+        length = np.hypot(edges[:, 2] - edges[:, 0], edges[:, 3] - edges[:, 1])
+        n = np.ceil(length / h).astype(int) + 1
+        ei = np.repeat(np.arange(len(edges)), n)
+        t = gtools.query.ragged_arange(n) / np.maximum(n - 1, 1)[ei]
+
+        self.samples = edges[ei, :2] + t[:, None] * (edges[ei, 2:] - edges[ei, :2])
+        self.sample_edge = ei
+        self.tree = sp.cKDTree(self.samples.reshape(-1, 2))
+
+    def __len__(self):
+        return len(self.samples)
+
+    # Fields of the given edges
+    def take(self, rows):
+        return {k: getattr(self, k)[rows] for k in FIELDS}
+
+class EdgeForest:
+
+    def __init__(self, h):
+        """Edges of one layer, in KD-trees of logarithmically growing size
+
+        Args:
+            h (float): maximum distance between edge samples, two edges within distance r have samples within r + h.
+
+        New edges go in a small block, blocks of similar size are merged so a query
+        visits O(log n) trees and inserting is cheap. Edges of structures that
+        changed are dropped when their block is merged.
+        """
+
+        self.h = h
+        self.blocks = []
+        self.count = 0
+        self._polys = 0
+
+    # Edges of the given (unit, version, polygons) as a new block
+    def block(self, shapes):
+
+        polys = [p for u, ver, ps in shapes for p in ps]
+        npoly = np.array([len(ps) for u, ver, ps in shapes], dtype = int)
+        size = np.array([len(p) for p in polys], dtype = int)
+        start = np.cumsum(size) - size
+
+        v0 = np.concatenate(polys) if polys else np.zeros((0, 2))
+        nxt = np.arange(len(v0)) + 1
+        nxt[start + size - 1] = start
+
+        # Turn clockwise polygons around, normals are taken to the right of each edge
+        cw = np.add.reduceat(v0[:, 0] * v0[nxt, 1] - v0[nxt, 0] * v0[:, 1], start) < 0 if polys else np.zeros(0, dtype = bool)
+        if cw.any():
+            local = np.arange(len(v0)) - np.repeat(start, size)
+            flip = np.repeat(cw, size)
+            v0 = v0[np.where(flip, np.repeat(start + size - 1, size) - local, np.arange(len(v0)))]
+
+        edges = np.concatenate([v0, v0[nxt]], axis = 1)
+
+        unit = np.repeat(np.repeat([u for u, ver, ps in shapes], npoly), size).astype(int)
+        version = np.repeat(np.repeat([ver for u, ver, ps in shapes], npoly), size).astype(int)
+        poly = np.repeat(self._polys + np.arange(len(polys)), size)
+        vertex = np.arange(len(v0)) - np.repeat(start, size)
+        size = np.repeat(size, size)
+        eid = self.count + np.arange(len(v0))
+        self._polys += len(polys)
+        self.count += len(v0)
+
+        # Holes are connected to the outline by a slit of two opposite edges, which is not a
+        # boundary. Only polygons that visit a vertex twice can have one.
+        keep = np.ones(len(edges), dtype = bool)
+        order = np.lexsort((v0[:, 1], v0[:, 0], poly))
+        rep = np.flatnonzero((poly[order][1:] == poly[order][:-1]) & np.all(v0[order][1:] == v0[order][:-1], axis = 1))
+        if len(rep):
+            rows = np.flatnonzero(np.isin(poly, poly[order][rep]))
+            key = np.concatenate([poly[rows, None], np.round(edges[rows] / 1e-9)], axis = 1).astype(np.int64)
+            _, inv = np.unique(np.concatenate([key, key[:, [0, 3, 4, 1, 2]]]), axis = 0, return_inverse = True)
+            inv = inv.reshape(-1)
+            keep[rows[np.isin(inv[:len(rows)], inv[len(rows):])]] = False
+
+        return EdgeBlock(edges[keep], eid[keep], unit[keep], version[keep], poly[keep], vertex[keep], size[keep], self.h)
+
+    #==============
+    # Insert block \\
+    #=========================================================================
+    # Merges the last blocks while the newest is at least half the size of  ||
+    # the one before it, dropping edges of outdated structure versions.     ||
+    #=========================================================================
+    def insert(self, block, versions):
+
+        self.blocks.append(block)
+        while len(self.blocks) > 1 and 2 * len(self.blocks[-1]) >= len(self.blocks[-2]):
+            b, a = self.blocks.pop(), self.blocks.pop()
+            keep = [x.version == versions[x.unit] for x in [a, b]]
+            parts = [np.concatenate([getattr(x, f)[k] for x, k in zip([a, b], keep)]) for f in FIELDS]
+            self.blocks.append(EdgeBlock(*parts, self.h))
+
+        return self
+
+#============================
+# Polygons per layer, merged \\
+#=========================================================================
+# Arguments:    structure   :   gdspy object or list of gdspy objects   ||
+#               precision   :   precision of gdspy.boolean              ||
+#                                                                       ||
+# Returns {layer: list of (n, 2) vertex arrays}                         ||
+#=========================================================================
+def shapes(structure, precision = 0.001):
+
+    by_layer = {}
+    for p, l in polygons(structure):
+        by_layer.setdefault(l, []).append(p)
+
+    out = {}
+    for l, polys in by_layer.items():
+        if len(polys) > 1:
+            merged = gd.boolean(polys, None, 'or', precision = precision, max_points = 0, layer = l)
+            if merged is None:
+                continue
+            polys = merged.polygons
+        out[l] = [np.asarray(p, dtype = float) for p in polys]
+
+    return out
+
+def polygons(structure):
+
+    if type(structure) is type([]):
+        return [x for s in structure for x in polygons(s)]
+
+    if isinstance(structure, (gd.FlexPath, gd.RobustPath)):
+        structure = structure.to_polygonset()
+
+    if isinstance(structure, gd.PolygonSet):
+        return list(zip(structure.polygons, structure.layers))
+
+    return []
+
+# Outward unit normals of counter-clockwise edges
+def normal(e):
+
+    d = e[:, 2:] - e[:, :2]
+    n = np.stack([d[:, 1], -d[:, 0]], axis = 1)
+
+    return n / np.maximum(np.hypot(n[:, 0], n[:, 1]), 1e-300)[:, None]
+
+#=====================================
+# Closest points of pairs of segments \\
+#=========================================================================
+# Arguments:    a, b    :   (n, 4) segments as x0, y0, x1, y1           ||
+#                                                                       ||
+# Returns (points on a, points on b, distances), distance 0 if the      ||
+# segments cross                                                        ||
+#=========================================================================
+def segment_closest(a, b):
+
+    cands = []
+    for p, s, flip in [(a[:, :2], b, False), (a[:, 2:], b, False), (b[:, :2], a, True), (b[:, 2:], a, True)]:
+        q = project(p, s)
+        cands.append((q, p) if flip else (p, q))
+
+    pa = np.stack([c[0] for c in cands])
+    pb = np.stack([c[1] for c in cands])
+    d = np.hypot(*(pb - pa).T.swapaxes(1, 2))
+    k = np.argmin(d, axis = 0)
+    r = np.arange(len(a))
+
+    pa, pb, d = pa[k, r], pb[k, r], d[k, r]
+
+    # Crossing segments
+    def orient(p, q, s):
+        return np.sign((q[:, 0] - p[:, 0]) * (s[:, 1] - p[:, 1]) - (q[:, 1] - p[:, 1]) * (s[:, 0] - p[:, 0]))
+
+    a0, a1, b0, b1 = a[:, :2], a[:, 2:], b[:, :2], b[:, 2:]
+    cross = (orient(a0, a1, b0) * orient(a0, a1, b1) < 0) & (orient(b0, b1, a0) * orient(b0, b1, a1) < 0)
+    d[cross] = 0
+
+    return pa, pb, d
+
+def project(p, s):
+
+    a, ab = s[:, :2], s[:, 2:] - s[:, :2]
+    ll = (ab**2).sum(axis = 1)
+    t = np.clip(((p - a) * ab).sum(axis = 1) / np.where(ll > 0, ll, 1), 0, 1)
+
+    return a + t[:, None] * ab
+
+#============================
+# Overlapping bounding boxes \\
+#=========================================================================
+# Arguments:    boxes   :   (n, 4) array of xmin, ymin, xmax, ymax, NaN ||
+#                           for boxes to skip                           ||
+#               rows    :   boxes to find the overlapping ones of       ||
+#                                                                       ||
+# Returns arrays (a, b) of unique pairs, a in rows                      ||
+#=========================================================================
+def box_pairs(boxes, rows):
+
+    valid = np.flatnonzero(~np.isnan(boxes[:, 0]))
+    if len(valid) == 0 or len(rows) == 0:
+        return np.zeros(0, dtype = int), np.zeros(0, dtype = int)
+
+    # Sweep over sorted xmin for normal boxes, the few very wide ones are tested against all
+    w = boxes[valid, 2] - boxes[valid, 0]
+    big = w > 4 * np.median(w)
+    small, large = valid[~big], valid[big]
+
+    order = small[np.argsort(boxes[small, 0])]
+    xs = boxes[order, 0]
+    wmax = w[~big].max() if len(small) else 0
+    lo = np.searchsorted(xs, boxes[rows, 0] - wmax, side = 'left')
+    hi = np.searchsorted(xs, boxes[rows, 2], side = 'left')
+    n = hi - lo
+
+    a = np.concatenate([np.repeat(rows, n), np.repeat(rows, len(large))])
+    b = np.concatenate([order[np.repeat(lo, n) + gtools.query.ragged_arange(n)], np.tile(large, len(rows))])
+
+    A, B = boxes[a], boxes[b]
+    hit = (A[:, 0] < B[:, 2]) & (A[:, 2] > B[:, 0]) & (A[:, 1] < B[:, 3]) & (A[:, 3] > B[:, 1]) & (a != b)
+    a, b = a[hit], b[hit]
+
+    # Pairs of two rows are found twice
+    key = np.unique(np.minimum(a, b) * len(boxes) + np.maximum(a, b))
+    a, b = key // len(boxes), key % len(boxes)
+    flip = ~np.isin(a, rows)
+
+    return np.where(flip, b, a), np.where(flip, a, b)
+
+# Are two structures directly connected (or part of each other)
+def linked(a, b):
+
+    def near(s):
+        out = list(s.prev.values()) + list(s.next.values()) + list(s.compound)
+        if s.type == 'StructureArray':
+            for view in s._views.values():
+                out += list(view.prev.values()) + list(view.next.values())
+        return [getattr(x, 'array', x) for x in out]
+
+    return any(x is b for x in near(a)) or any(x is a for x in near(b))
+
+#=======================
+# Make violation marker \\
+#=========================================================================
+# GDStructure with endpoints at the two closest points, linked to the   ||
+# offending structures through .prev and the details in .args           ||
+#=========================================================================
+def marker(geometry, p1, p2, a, b, rule, value, limit, layer):
+
+    m = gtools.classes.GDStructure(geometry, {'A': tuple(np.asarray(p1).tolist()), 'B': tuple(np.asarray(p2).tolist())}, {'A': None, 'B': None}, args = {'rule': rule, 'value': value, 'limit': limit, 'layer': layer})
+    m.prev['A'] = a
+    m.prev['B'] = b
+
+    return m
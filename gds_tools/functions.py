@@ -43,6 +43,15 @@ def VecRot(rad, vec, origin = (0, 0)):
     #=========================================================================
     return (RotMat(rad).dot(np.array(vec) - np.array(origin)) + np.array(origin)).tolist()[0]
 
+def label(i):
+    #=========================
+    # Endpoint label number i \\
+    #=========================================================================
+    # Same names as gds_tools.alphabet (A..Z, A1..Z1, A2..) but without the ||
+    # limit of 520 entries.                                                 ||
+    #=========================================================================
+    return gtools.a[i % 26] + (str(i // 26) if i >= 26 else '')
+
 def instruction_parse(s, args = None):
     #============================
     # Simple instructions parser \\
@@ -135,7 +144,7 @@ def lattice(cell, repeat, spacing):
     ends = {'A': (0, spacing[1] * repeat[1] / 2), 'B': (spacing[0] * (repeat[0] - 1) / 2, spacing[1] * (repeat[1] - 1/2))}
     epsz = {'A': 0, 'B': 0}
 
-    return gtools.classes.GDStructure(array, ends, epsz)
+    return gtools.classes.GDStructure(array, ends, epsz, method = lattice, args = {'cell': cell, 'repeat': repeat, 'spacing': spacing})
 
 def lattice_cutter(lattice, objectlist, mode = 'and', layer = 0):
     #=====================================
@@ -180,6 +189,11 @@ def cluster(objectlist, endpoints, endpoint_dims, endpoint_directions = None, me
     else:
         objectlist[0].endpoint_directions = {}
     objectlist[0].compound += objectlist[1:]
+    objectlist[0].moved()
+
+    # Everything clustered so far is made by method, regenerate() replaces it
+    if method != None:
+        objectlist[0].__generated__ = list(objectlist[0].compound)
 
     objectlist[0].method = method
     objectlist[0].__args_tuple__ = recordclass('args', args.keys())
@@ -191,16 +205,22 @@ def cluster(objectlist, endpoints, endpoint_dims, endpoint_directions = None, me
 
     return objectlist[0]
 
-def add(cell, objectlist):
+def add(cell, objectlist, simplify = False):
     #================================
     # Add structures to a gdspy cell \\
     #=========================================================================
     # Arguments:    cell        :   gdspy cell object                       ||
     #               objectlist  :   list of GDStructure objects             ||
+    #    (optional) simplify    :   simplify() the structures first (in     ||
+    #                               place), True for tolerance 0.001 or the ||
+    #                               tolerance                               ||
     #=========================================================================
     if type(objectlist) is not type([]):
         objectlist = [objectlist]
 
+    if simplify is not False:
+        gtools.funcs.simplify(objectlist, tolerance = 0.001 if simplify is True else simplify)
+
     structs = []
     for i in objectlist:
         if i.structure:
@@ -244,13 +264,33 @@ def symm_coords(points, mirror_x = True, mirror_y = True):
             output_points.append((-val[0], -val[1]))
     return output_points
 
-def save(cell, filename, unit = 1e-6, precision = 1e-9):
+def save(cell, filename, unit = 1e-6, precision = 1e-9, simplify = False):
     #=====================
     # Save cell to a file \\
     #=========================================================================
     # Arguments:    cell        :   gdspy cell object or a list of cells    ||
     #               filename    :   filename to write to (relative path)    ||
+    #    (optional) simplify    :   write simplify()'d copies of the        ||
+    #                               polygons, True for a tolerance of one   ||
+    #                               database unit (precision / unit) or the ||
+    #                               tolerance in user units. The cell(s)    ||
+    #                               and structures are not changed          ||
     #=========================================================================
+    if simplify is not False:
+        cells = []
+        for c in (cell if type(cell) == type([]) else [cell]):
+
+            # simplify() replaces the vertex arrays of a polygon set, so a shallow copy of each is enough
+            out = gd.Cell(c.name, exclude_from_current = True)
+            out.polygons = [copy.copy(p) for p in c.polygons]
+            out.paths = [copy.copy(p) for p in c.paths]
+            out.labels = list(c.labels)
+            out.references = list(c.references)
+            cells.append(out)
+
+        gtools.funcs.simplify(cells, tolerance = precision / unit if simplify is True else simplify)
+        cell = cells if type(cell) == type([]) else cells[0]
+
     writer = gd.GdsWriter(filename, unit = unit, precision = precision)
     print(cell)
     if type(cell) == type([]):
@@ -261,12 +301,204 @@ def save(cell, filename, unit = 1e-6, precision = 1e-9):
 
     return writer.close()
 
+def simplify(objectlist, tolerance = 0.001, compound = True, verbose = True):
+    #=============================
+    # Remove superfluous vertices \\
+    #=========================================================================
+    # Merges duplicate and collinear points and replaces curves by fewer    ||
+    # points that deviate at most tolerance from the original outline       ||
+    # (Douglas-Peucker). The geometry is changed in place. Of FlexPath      ||
+    # objects only the collinear points of the spine are merged, RobustPath ||
+    # objects and cell references are left as they are. The instances of a  ||
+    # StructureArray are only simplified if they all keep the same number   ||
+    # of vertices.                                                          ||
+    #                                                                       ||
+    # Arguments:    objectlist  :   GDStructure, gdspy cell or PolygonSet,  ||
+    #                               or a list of these                      ||
+    #    (optional) tolerance   :   maximum deviation from the outline      ||
+    #               compound    :   also simplify compound structures       ||
+    #               verbose     :   print vertex count before and after     ||
+    #                                                                       ||
+    # Returns (vertices before, vertices after)                             ||
+    #=========================================================================
+    # Collect every polygon and path object once
+    found = {}
+    paths = {}
+    arrays = {}
+    def collect(o):
+
+        if type(o) is type([]):
+            for i in o:
+                collect(i)
+        elif isinstance(o, gtools.classes.GDStructure):
+            collect(o.structure)
+            if compound:
+                collect(o.compound)
+        elif isinstance(o, gtools.classes.StructureArray):
+            arrays[id(o)] = o
+        elif isinstance(o, gd.Cell):
+            collect(o.polygons)
+            collect(o.paths)
+            if hasattr(o, '_bb_valid'):
+                o._bb_valid = False
+        elif isinstance(o, gd.PolygonSet):
+            found[id(o)] = o
+        elif isinstance(o, gd.FlexPath):
+            paths[id(o)] = o
+
+    collect(objectlist)
+
+    sets = list(found.values())
+    polys = [p for ps in sets for p in ps.polygons]
+    simple = simplify_polygons(polys, tolerance)
+
+    i = 0
+    for ps in sets:
+        n = len(ps.polygons)
+        ps.polygons = simple[i:i + n]
+        i += n
+
+    before, after = sum(len(p) for p in polys), sum(len(p) for p in simple)
+    for a in arrays.values():
+        v = simplify_polygons(list(a.vertices), tolerance)
+        before += a.vertices.shape[0] * a.vertices.shape[1]
+        if len(set(len(p) for p in v)) == 1:
+            a.vertices = np.stack(v)
+            a.moved()
+        after += a.vertices.shape[0] * a.vertices.shape[1]
+    for p in paths.values():
+        before += len(p.points)
+        simplify_path(p)
+        after += len(p.points)
+    if verbose:
+        print('>> Simplified ' + str(len(polys) + sum(len(a) for a in arrays.values())) + ' polygon(s) and ' + str(len(paths)) + ' path(s) from ' + str(before) + ' to ' + str(after) + ' vertices.')
+
+    return before, after
+
+def simplify_path(path):
+    #=============================
+    # Merge collinear path points \\
+    #=========================================================================
+    # Removes spine points of a gdspy FlexPath that lie on the straight     ||
+    # line between their neighbours and have the same widths and offsets,   ||
+    # so the outline of the path does not change.                           ||
+    #                                                                       ||
+    # Arguments:    path    :   gdspy FlexPath                              ||
+    #=========================================================================
+    p = path.points
+    if len(p) < 3:
+        return path
+
+    a, b = p[1:-1] - p[:-2], p[2:] - p[1:-1]
+    cross = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+    straight = (np.abs(cross) <= 1e-9 * np.hypot(*a.T) * np.hypot(*b.T)) & (np.sum(a * b, axis = 1) > 0)
+
+    for q in [path.widths, path.offsets]:
+        straight &= np.all(q[1:-1] == q[:-2], axis = 1) & np.all(q[1:-1] == q[2:], axis = 1)
+
+    keep = np.concatenate([[True], ~straight, [True]])
+    path.points, path.widths, path.offsets = p[keep], path.widths[keep], path.offsets[keep]
+    path._polygon_dict = None
+
+    return path
+
+def simplify_polygons(polygons, tolerance = 0.001):
+    #==================================
+    # Simplify a list of vertex arrays \\
+    #=========================================================================
+    # All polygons are handled at once, Douglas-Peucker splits every        ||
+    # segment of every polygon in the same step. Polygons that would end    ||
+    # up with less than 3 vertices are returned unchanged.                  ||
+    #                                                                       ||
+    # Arguments:    polygons    :   list of (n, 2) vertex arrays            ||
+    #    (optional) tolerance   :   maximum deviation from the outline      ||
+    #=========================================================================
+    if not polygons:
+        return []
+
+    v = np.concatenate([np.asarray(p, dtype = float).reshape(-1, 2) for p in polygons])
+    size = np.array([len(p) for p in polygons], dtype = int)
+
+    # Drop vertices from v, but keep polygons that would collapse as they are
+    def reduce(v, size, keep):
+        owner = np.repeat(np.arange(len(size)), size)
+        left = np.bincount(owner, weights = keep, minlength = len(size))
+        keep = keep | (left < 3)[owner]
+        return v[keep], np.bincount(owner, weights = keep, minlength = len(size)).astype(int)
+
+    # Neighbours of every vertex within its polygon
+    def around(size):
+        start = np.repeat(np.cumsum(size) - size, size)
+        k = gtools.query.ragged_arange(size)
+        n = np.repeat(size, size)
+        return start + (k - 1) % n, start + (k + 1) % n
+
+    # Duplicates, then points on the straight line between their neighbours
+    def collinear(v, size):
+        prv, nxt = around(size)
+        v, size = reduce(v, size, np.any(v != v[prv], axis = 1) | (size < 3).repeat(size))
+
+        prv, nxt = around(size)
+        a, b = v - v[prv], v[nxt] - v
+        cross = a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0]
+        straight = (np.abs(cross) <= 1e-9 * np.hypot(*a.T) * np.hypot(*b.T)) & (np.sum(a * b, axis = 1) > 0)
+        return reduce(v, size, ~straight)
+
+    v, size = collinear(v, size)
+
+    if tolerance > 0:
+        # Every ring closed with a copy of its first vertex, first vertex is always kept
+        k = gtools.query.ragged_arange(size + 1)
+        ring = np.repeat(np.cumsum(size) - size, size + 1) + np.where(k == np.repeat(size, size + 1), 0, k)
+        ex, ey = v[ring, 0], v[ring, 1]
+
+        # Triangles and quadrilaterals (most of a layout) are kept as they are
+        a = np.cumsum(size + 1) - size - 1
+        b = a + size
+        keep = np.repeat(size < 5, size + 1)
+        keep[a] = True
+        a, b = a[size >= 5], b[size >= 5]
+
+        while len(a):
+            count = b - a - 1
+            a, b, count = a[count > 0], b[count > 0], count[count > 0]
+            if not len(a):
+                break
+
+            # Squared distance of every vertex in between to segment a-b
+            rows = np.repeat(a, count) + gtools.query.ragged_arange(count) + 1
+            ax, ay = np.repeat(ex[a], count), np.repeat(ey[a], count)
+            dx, dy = np.repeat(ex[b] - ex[a], count), np.repeat(ey[b] - ey[a], count)
+            px, py = ex[rows] - ax, ey[rows] - ay
+            ll = dx * dx + dy * dy
+            t = np.clip((px * dx + py * dy) / np.where(ll > 0, ll, 1), 0, 1)
+            px, py = px - t * dx, py - t * dy
+            d = px * px + py * py
+
+            # Farthest vertex of every segment, splits the segment if it is too far off.
+            # Of (nearly) equally far vertices the middle one, so staircases split in halves
+            first = np.cumsum(count) - count
+            dmax = np.maximum.reduceat(d, first)
+            off = np.where(d >= np.repeat(dmax, count) * (1 - 1e-6), np.abs(2 * rows - np.repeat(a + b, count)), 2 * len(ex))
+            hit = np.flatnonzero(off == np.repeat(np.minimum.reduceat(off, first), count))
+            m = rows[hit[np.unique(np.repeat(np.arange(len(a)), count)[hit], return_index = True)[1]]]
+
+            split = dmax > tolerance**2
+            keep[m[split]] = True
+            a, b = np.concatenate([a[split], m[split]]), np.concatenate([m[split], b[split]])
+
+        v, size = reduce(v, size, keep[k < np.repeat(size, size + 1)])
+        v, size = collinear(v, size)
+
+    return np.split(v, np.cumsum(size)[:-1])
+
 def inside(points, cellref, dist, nop = 3, precision = 0.001):
     #=====================
     # Save cell to a file \\
     #=========================================================================
     # Arguments:    points      :   list of points to check                 ||
-    #               cellref     :   gdspy cell reference object             ||
+    #               cellref     :   gdspy cell reference object, or a       ||
+    #                               query.PolygonIndex                      ||
     #               dist        :   distance from points to search          ||
     #               nop         :   number of probe points within dist      ||
     #               precision   :   gdspy.inside precision parameter        ||
@@ -275,10 +507,12 @@ def inside(points, cellref, dist, nop = 3, precision = 0.001):
     if nop % 2 == 0:
         nop += 1
 
-    search_ps = []
-    for p in points:
-        px = np.linspace(p[0] - dist/2, p[0] + dist/2, nop)
-        py = np.linspace(p[1] - dist/2, p[1] + dist/2, nop)
-        search_ps.append([[i, j] for i in px for j in py])
+    # Probe grid around every point
+    offs = np.linspace(-dist/2, dist/2, nop)
+    grid = np.stack(np.meshgrid(offs, offs, indexing = 'ij'), axis = -1).reshape(-1, 2)
+    search_ps = np.asarray(points, dtype = float).reshape(-1, 1, 2) + grid
+
+    if isinstance(cellref, gtools.query.PolygonIndex):
+        return cellref.inside(search_ps.reshape(-1, 2)).reshape(len(search_ps), -1).any(axis = 1).tolist()
 
-    return gd.inside(search_ps, cellref, precision = precision)
+    return gd.inside(search_ps.tolist(), cellref, precision = precision)
@@ -17,7 +17,7 @@ def hollow_box(size, border_width, layer = 0):
     ends = {'A': (0, size[1] / 2), 'B': (size[0] / 2, 0), 'C': (size[0] / 2, size[1]), 'D': (size[0], size[1] / 2), 'CENTER': (size[0] / 2, size[1] / 2)}
     epsz = {'A': size[1], 'CENTER': None}
 
-    return gtools.classes.GDStructure(hbox, ends, epsz)
+    return gtools.classes.GDStructure(hbox, ends, epsz, method = hollow_box, args = {'size': size, 'border_width': border_width, 'layer': layer})
 
 #========================
 # Generate a regular box \\
@@ -31,7 +31,7 @@ def box(size, layer = 0, datatype = 0):
             'W': (0, 0), 'X': (size[0], 0), 'Y': (size[0], size[1]), 'Z': (0, size[1])}
     epsz = {'A': size[1], 'D': size[1], 'B': size[0], 'C': size[0], 'CENTER': None, 'W': size[0], 'X': size[0], 'Y': size[0], 'Z': size[0]}
 
-    return gtools.classes.GDStructure(box, ends, epsz)
+    return gtools.classes.GDStructure(box, ends, epsz, method = gtools.geometry.box, args = {'size': size, 'layer': layer, 'datatype': datatype})
 
 #===================
 # Generate a circle \\
@@ -45,7 +45,7 @@ def circle(r, resolution = 100, layer = 0):
     ends = {'CENTER': (0, 0), 'BOTTOM': (0, -r)}
     epsz = {'CENTER': r, 'BOTTOM': None}
 
-    return gtools.classes.GDStructure(circle, ends, epsz)
+    return gtools.classes.GDStructure(circle, ends, epsz, method = gtools.geometry.circle, args = {'r': r, 'resolution': resolution, 'layer': layer})
 
 def triangle(side_1, side_2, angle, layer = 0):
 
@@ -55,4 +55,69 @@ def triangle(side_1, side_2, angle, layer = 0):
     ends = {gtools.alphabet[i]: p[i] for i in range(0, len(p))}
     epsz = {gtools.alphabet[i]: None for i in range(0, len(p))}
 
-    return gtools.classes.GDStructure(poly, ends, epsz)
+    return gtools.classes.GDStructure(poly, ends, epsz, method = triangle, args = {'side_1': side_1, 'side_2': side_2, 'angle': angle, 'layer': layer})
+
+#=============================
+# Generate many boxes at once \\
+#=========================================================================
+# Arguments:    sizes       :   (N, 2) box sizes, or one (x, y) size    ||
+#    (optional) positions   :   (N, 2) positions of the lower left      ||
+#                               corners, defaults to (0, 0)             ||
+#=========================================================================
+def boxes(sizes, positions = (0, 0), layer = 0, datatype = 0):
+
+    size, pos = np.broadcast_arrays(np.atleast_2d(np.asarray(sizes, dtype = float)), np.atleast_2d(np.asarray(positions, dtype = float)))
+    x, y = size[:, 0], size[:, 1]
+    z = np.zeros(len(x))
+
+    verts = np.stack([np.stack([z, z], axis = 1), np.stack([z, y], axis = 1), np.stack([x, y], axis = 1), np.stack([x, z], axis = 1)], axis = 1) + pos[:, None, :]
+    ends = {'A': (z, y / 2), 'B': (x / 2, z), 'C': (x / 2, y), 'D': (x, y / 2), 'CENTER': (x / 2, y / 2),
+            'W': (z, z), 'X': (x, z), 'Y': (x, y), 'Z': (z, y)}
+    ends = {k: np.stack(v, axis = 1) + pos for k, v in ends.items()}
+    epsz = {'A': y, 'D': y, 'B': x, 'C': x, 'CENTER': None, 'W': x, 'X': x, 'Y': x, 'Z': x}
+
+    return gtools.classes.StructureArray(verts, ends, epsz, layer = layer, datatype = datatype)
+
+#===============================
+# Generate many circles at once \\
+#=========================================================================
+# Arguments:    radii       :   (N,) radii, or one radius               ||
+#    (optional) positions   :   (N, 2) centres, defaults to (0, 0)      ||
+#               resolution  :   number of points in [0..2pi]            ||
+#=========================================================================
+def circles(radii, positions = (0, 0), resolution = 100, layer = 0, datatype = 0):
+
+    pos = np.atleast_2d(np.asarray(positions, dtype = float))
+    r = np.asarray(radii, dtype = float).reshape(-1)
+    n = max(len(r), len(pos))
+    r, pos = np.broadcast_to(r, (n,)), np.broadcast_to(pos, (n, 2))
+
+    t = np.linspace(0, 2 * np.pi, resolution, endpoint = False)
+    verts = r[:, None, None] * np.stack([np.cos(t), np.sin(t)], axis = 1)[None, :, :] + pos[:, None, :]
+    ends = {'CENTER': pos, 'BOTTOM': pos - np.stack([np.zeros(n), r], axis = 1)}
+    epsz = {'CENTER': r, 'BOTTOM': None}
+
+    return gtools.classes.StructureArray(verts, ends, epsz, layer = layer, datatype = datatype)
+
+#=================================
+# Generate many triangles at once \\
+#=========================================================================
+# Arguments:    side_1, side_2, angle   :   as triangle(), (N,) arrays  ||
+#                                           or scalars                  ||
+#    (optional) positions               :   (N, 2) positions            ||
+#=========================================================================
+def triangles(side_1, side_2, angle, positions = (0, 0), layer = 0, datatype = 0):
+
+    s1, s2, a = [np.asarray(v, dtype = float).reshape(-1) for v in [side_1, side_2, angle]]
+    pos = np.atleast_2d(np.asarray(positions, dtype = float))
+    n = max(len(s1), len(s2), len(a), len(pos))
+    s1, s2, a = [np.broadcast_to(v, (n,)) for v in [s1, s2, a]]
+    pos = np.broadcast_to(pos, (n, 2))
+    z = np.zeros(n)
+
+    p = [np.stack([z, z], axis = 1), np.stack([s1, z], axis = 1), np.stack([s2 * np.cos(a), s2 * np.sin(a)], axis = 1)]
+    verts = np.stack(p, axis = 1) + pos[:, None, :]
+    ends = {gtools.alphabet[i]: p[i] + pos for i in range(0, len(p))}
+    epsz = {gtools.alphabet[i]: None for i in range(0, len(p))}
+
+    return gtools.classes.StructureArray(verts, ends, epsz, layer = layer, datatype = datatype)
@@ -13,6 +13,6 @@ import gds_tools as gtools
 def circle(radius, endpoint, npoints = 100, layer = 0, datatype = 0):
 
     c = gd.Round(endpoint, radius, number_of_points = npoints, layer = layer, datatype = datatype)
-    c = gtools.classes.GDStructure(c, {'A': endpoint}, {'A': 2*radius})
+    c = gtools.classes.GDStructure(c, {'A': endpoint}, {'A': 2*radius}, method = gtools.heal.circle, args = {'radius': radius, 'endpoint': endpoint, 'npoints': npoints, 'layer': layer, 'datatype': datatype})
 
     return c
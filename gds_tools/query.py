@@ -0,0 +1,323 @@
+import numpy as np
+import gdspy as gd
+import scipy.spatial as sp
+import gds_tools as gtools
+
+class PolygonIndex:
+
+    def __init__(self, polygons, layer = None, datatype = None, precision = 0.001, max_pairs = 4000000):
+        """Query index for exact point-in-polygon and point-to-polygon distance tests
+
+        Args:
+            polygons: gdspy Cell, CellReference, PolygonSet (or path), GDStructure, or a list of these and/or (n, 2) vertex arrays.
+            layer (int or list, optional): only index polygons on this layer (or these layers). Defaults to None (all layers).
+            datatype (int or list, optional): only index polygons with this datatype (or these datatypes). Defaults to None (all datatypes).
+            precision (float, optional): vertices and query points are rounded to this grid, like gdspy.inside(). None for no rounding. Defaults to 0.001.
+            max_pairs (int, optional): maximum number of point-edge pairs tested at once, bounds memory use of a query. Defaults to 4e6.
+
+        Polygon edges are bucketed on a regular grid over the bounding box, a point
+        is only tested against the edges in its grid cell that can cross a ray cast
+        from it in +x direction and belong to a polygon whose bounding box contains it.
+        A point is inside when it is inside any polygon (even-odd rule per polygon)
+        or on its boundary, which is the same as gdspy.inside().
+        """
+
+        self.precision = precision
+        self.max_pairs = max_pairs
+
+        polys = [p for p in gather(polygons, layer, datatype) if len(p) >= 3]
+        self.polygons = polys
+
+        # Edge list of all polygons at once, closing edges included
+        size = np.array([len(p) for p in polys], dtype = int)
+        start = np.cumsum(size) - size
+        owner = np.repeat(np.arange(len(polys)), size)
+
+        v0 = self._round(np.concatenate(polys).astype(float)) if polys else np.zeros((0, 2))
+        nxt = np.arange(len(v0)) + 1
+        nxt[start + size - 1] = start
+
+        self.edges = np.concatenate([v0, v0[nxt]], axis = 1)
+        self.owner = owner
+
+        # Contiguous copies of the edge coordinates for the inside test
+        self._x0, self._y0, self._x1, self._y1 = [np.ascontiguousarray(c) for c in self.edges.T]
+        self._ymin, self._ymax = np.minimum(self._y0, self._y1), np.maximum(self._y0, self._y1)
+        self.bbox = np.concatenate([np.minimum.reduceat(v0, start), np.maximum.reduceat(v0, start)], axis = 1) if polys else np.zeros((0, 4))
+
+        self._build_grid()
+        self._tree = None
+
+    def __len__(self):
+        return len(self.polygons)
+
+    def _round(self, points):
+        return points if not self.precision else np.round(points / self.precision) * self.precision
+
+    # Bucket edges on a grid, coarsened until replication of edges stays bounded
+    def _build_grid(self):
+
+        e = self.edges
+        ids = np.arange(len(e))
+
+        if len(ids) == 0:
+            self.origin = np.zeros(2)
+            self.pitch = np.ones(2)
+            self.shape = (1, 1)
+            self._offsets = np.zeros(2, dtype = int)
+            self._bucket = np.zeros(0, dtype = int)
+            return
+
+        lo = self.bbox[:, :2].min(axis = 0)
+        hi = self.bbox[:, 2:].max(axis = 0)
+        size = np.maximum(hi - lo, 1e-9)
+
+        ymin = np.minimum(e[:, 1], e[:, 3])
+        ymax = np.maximum(e[:, 1], e[:, 3])
+        xmax = np.maximum(e[:, 0], e[:, 2])
+        pxmin = self.bbox[self.owner[ids], 0]
+
+        n = max(1, int(np.sqrt(2 * len(ids))))
+        while True:
+            nx = max(1, int(round(n * np.sqrt(size[0] / size[1])))) if size[0] > 1e-9 else 1
+            ny = max(1, int(round(n * np.sqrt(size[1] / size[0])))) if size[1] > 1e-9 else 1
+            nx, ny = min(nx, 2048), min(ny, 2048)
+            pitch = size / [nx, ny]
+
+            r0 = np.clip(((ymin - lo[1]) / pitch[1]).astype(int), 0, ny - 1)
+            r1 = np.clip(((ymax - lo[1]) / pitch[1]).astype(int), 0, ny - 1)
+            c0 = np.clip(((pxmin - lo[0]) / pitch[0]).astype(int), 0, nx - 1)
+            c1 = np.clip(((xmax - lo[0]) / pitch[0]).astype(int), 0, nx - 1)
+
+            count = (r1 - r0 + 1) * (c1 - c0 + 1)
+            if count.sum() <= 16 * len(ids) + nx * ny or n == 1:
+                break
+            n = max(1, n // 2)
+
+        # Expand every edge to the grid cells where it can cross a ray cast in +x direction
+        rep = np.repeat(np.arange(len(ids)), count)
+        k = ragged_arange(count)
+        w = (c1 - c0 + 1)[rep]
+        rows = r0[rep] + k // w
+        cols = c0[rep] + k % w
+        cells = rows * nx + cols
+
+        # Sorted by cell, then by polygon so that crossings of one polygon are adjacent
+        order = np.lexsort((self.owner[ids[rep]], cells))
+
+        self.origin = lo
+        self.extent = hi
+        self.pitch = pitch
+        self.shape = (ny, nx)
+        self._bucket = ids[rep[order]]
+        self._offsets = np.concatenate([[0], np.cumsum(np.bincount(cells, minlength = nx * ny))])
+
+    def _cell(self, points):
+
+        ny, nx = self.shape
+        ok = np.all((points >= self.origin) & (points <= self.extent), axis = 1)
+        ij = np.floor((points - self.origin) / self.pitch).astype(int)
+        ij = np.minimum(ij, [nx - 1, ny - 1])
+
+        return np.where(ok, ij[:, 1] * nx + ij[:, 0], -1)
+
+    #=======================
+    # Point in polygon test \\
+    #=========================================================================
+    # Arguments:    points  :   (n, 2) array of points                      ||
+    #                                                                       ||
+    # Returns boolean array, True for points inside any polygon             ||
+    #=========================================================================
+    def inside(self, points):
+
+        points = self._round(np.asarray(points, dtype = float).reshape(-1, 2))
+        out = np.zeros(len(points), dtype = bool)
+
+        if len(self._bucket) == 0 or len(points) == 0:
+            return out
+
+        cell = self._cell(points)
+        rows = np.flatnonzero(cell >= 0)
+        count = self._offsets[cell[rows] + 1] - self._offsets[cell[rows]]
+        rows, count = rows[count > 0], count[count > 0]
+
+        # Split in chunks of at most max_pairs point-edge pairs
+        cum = np.cumsum(count)
+        start = 0
+        while start < len(rows):
+            base = cum[start - 1] if start else 0
+            stop = max(start + 1, np.searchsorted(cum, base + self.max_pairs, side = 'right'))
+            out[rows[start:stop]] = self._inside(points, rows[start:stop], cell, count[start:stop])
+            start = stop
+
+        return out
+
+    def _inside(self, points, rows, cell, count):
+
+        pi = np.repeat(np.arange(len(rows)), count)
+        ei = self._bucket[np.repeat(self._offsets[cell[rows]], count) + ragged_arange(count)]
+
+        px, py = points[rows[pi], 0], points[rows[pi], 1]
+
+        # Only edges that span the height of the point can be crossed or touched
+        tol = 1e-9 * np.maximum(np.abs(py), 1)
+        sel = np.flatnonzero((self._ymin[ei] <= py + tol) & (self._ymax[ei] >= py - tol))
+        pi, ei, px, py, tol = pi[sel], ei[sel], px[sel], py[sel], tol[sel]
+        x0, y0, x1, y1 = self._x0[ei], self._y0[ei], self._x1[ei], self._y1[ei]
+        dx, dy = x1 - x0, y1 - y0
+
+        # Crossing number, half-open in y so shared vertices are counted once
+        cross = (y0 > py) != (y1 > py)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            cross &= px < x0 + (py - y0) * dx / dy
+
+        # Points on an edge count as inside, up to floating point round-off
+        on = np.abs((px - x0) * dy - (py - y0) * dx) <= tol * (np.abs(dx) + np.abs(dy))
+        on &= (px >= np.minimum(x0, x1) - tol) & (px <= np.maximum(x0, x1) + tol)
+
+        res = np.zeros(len(rows), dtype = bool)
+        res[pi[on]] = True
+
+        pi, poly = pi[cross], self.owner[ei[cross]]
+        if len(pi) == 0:
+            return res
+
+        # Odd number of crossings with a polygon means inside that polygon
+        key = pi * len(self.polygons) + poly
+        starts = np.flatnonzero(np.concatenate([[True], key[1:] != key[:-1]]))
+        runs = np.diff(np.concatenate([starts, [len(key)]]))
+        res[pi[starts[runs % 2 == 1]]] = True
+
+        return res
+
+    #=============================
+    # Distance to nearest polygon \\
+    #=========================================================================
+    # Arguments:    points  :   (n, 2) array of points                      ||
+    #    (optional) signed  :   negative distance for points inside         ||
+    #               k       :   initial number of edge samples to check     ||
+    #                                                                       ||
+    # Returns array of distances to the nearest polygon edge, 0 for points  ||
+    # inside a polygon unless signed = True                                 ||
+    #=========================================================================
+    def distance(self, points, signed = False, k = 16):
+
+        points = np.asarray(points, dtype = float).reshape(-1, 2)
+        d = np.full(len(points), np.inf)
+
+        if len(self.edges) == 0 or len(points) == 0:
+            return d
+
+        self._build_tree()
+
+        step = max(1, self.max_pairs // 64)
+        for i in range(0, len(points), step):
+            d[i:i + step] = self._distance(points[i:i + step], k)
+
+        ins = self.inside(points)
+        d[ins] = -d[ins] if signed else 0
+
+        return d
+
+    def _distance(self, points, k):
+
+        n = len(self._samples)
+        d = np.full(len(points), np.inf)
+
+        # Every edge has a sample within h/2 of each of its points, so an edge without
+        # a sample among the k nearest is at least (k-th sample distance) - h/2 away
+        todo = np.arange(len(points))
+        while len(todo):
+            k = min(k, n)
+            ds, idx = self._tree.query(points[todo], k = k)
+            ds, idx = ds.reshape(len(todo), k), idx.reshape(len(todo), k)
+            d[todo] = segment_distance(points[todo, None, :], self.edges[self._samples_edge[idx]]).min(axis = 1)
+
+            if k == n:
+                break
+            todo = todo[ds[:, -1] - self._h / 2 < d[todo]]
+            k *= 4
+
+        return d
+
+    # KD-tree over points sampled along the edges, at most h apart
+    def _build_tree(self):
+
+        if self._tree is not None:
+            return
+
+        e = self.edges
+        length = np.hypot(e[:, 2] - e[:, 0], e[:, 3] - e[:, 1])
+        self._h = max(length.sum() / len(e), 1e-9)
+
+        n = np.ceil(length / self._h).astype(int) + 1
+        ei = np.repeat(np.arange(len(e)), n)
+        t = ragged_arange(n) / np.maximum(n - 1, 1)[ei]
+
+        self._samples = e[ei, :2] + t[:, None] * (e[ei, 2:] - e[ei, :2])
+        self._samples_edge = ei
+        self._tree = sp.cKDTree(self._samples)
+
+#===========================
+# Collect polygons of input \\
+#=========================================================================
+# Arguments:    polygons    :   see PolygonIndex                        ||
+#    (optional) layer       :   only return polygons on layer(s)        ||
+#               datatype    :   only return polygons with datatype(s)   ||
+#=========================================================================
+def gather(polygons, layer = None, datatype = None):
+
+    layers = None if layer == None else (layer if type(layer) is type([]) else [layer])
+    datatypes = None if datatype == None else (datatype if type(datatype) is type([]) else [datatype])
+
+    def keep(spec):
+        return (layers == None or spec[0] in layers) and (datatypes == None or spec[1] in datatypes)
+
+    if isinstance(polygons, (gd.Cell, gd.CellReference, gd.CellArray)):
+        by_spec = polygons.get_polygons(by_spec = True)
+        return [p for spec in by_spec if keep(spec) for p in by_spec[spec]]
+
+    if isinstance(polygons, gtools.classes.GDStructure):
+        return gather(polygons.structure, layer, datatype)
+
+    if isinstance(polygons, (gd.FlexPath, gd.RobustPath)):
+        polygons = polygons.to_polygonset()
+
+    if isinstance(polygons, gd.PolygonSet):
+        return [p for p, l, d in zip(polygons.polygons, polygons.layers, polygons.datatypes) if keep((l, d))]
+
+    if isinstance(polygons, np.ndarray) and polygons.ndim == 2:
+        return [polygons]
+
+    out = []
+    for p in polygons:
+        out += gather(p, layer, datatype)
+
+    return out
+
+#===========================
+# Point to segment distance \\
+#=========================================================================
+# Arguments:    p       :   (..., 2) points                             ||
+#               e       :   (..., 4) segments as x0, y0, x1, y1         ||
+#=========================================================================
+def segment_distance(p, e):
+
+    a, b = e[..., :2], e[..., 2:]
+    ab = b - a
+    ll = (ab**2).sum(axis = -1)
+    t = ((p - a) * ab).sum(axis = -1) / np.where(ll > 0, ll, 1)
+    t = np.clip(t, 0, 1)[..., None]
+
+    return np.hypot(*np.moveaxis(p - (a + t * ab), -1, 0))
+
+# Concatenation of arange(c) for every c in counts
+def ragged_arange(counts):
+
+    counts = np.asarray(counts, dtype = int)
+    total = counts.sum()
+    if total == 0:
+        return np.zeros(0, dtype = int)
+
+    starts = np.cumsum(counts) - counts
+    return np.arange(total) - np.repeat(starts, counts)
@@ -1,6 +1,9 @@
 import numpy as np
 import scipy.spatial as sp
 import copy
+import heapq
+import zlib
+import struct
 import gdspy as gd
 import gds_tools as gtools
 
@@ -23,43 +26,196 @@ def line(dxy, width, width_end = False, layer = 0, datatype = 0):
     ends = {'A': p[0], 'B': p[-1]}
     epsz = {'A': w[0], 'B': w[-1]}
 
-    return gtools.classes.GDStructure(poly, ends, epsz)
+    return gtools.classes.GDStructure(poly, ends, epsz, method = line, args = {'dxy': dxy, 'width': width, 'width_end': width_end, 'layer': layer, 'datatype': datatype})
+
+#======================================
+# Make many transmission lines at once \\
+#=========================================================================
+# Arguments:    dxy         :   (N, 2) line lengths, or one (dx, dy)    ||
+#               width       :   (N,) widths of the lines, or one width  ||
+#    (optional) width_end   :   different width at the end              ||
+#               positions   :   (N, 2) start points, defaults to (0, 0) ||
+#=========================================================================
+def lines(dxy, width, width_end = False, positions = (0, 0), layer = 0, datatype = 0):
+
+    d, pos = np.broadcast_arrays(np.atleast_2d(np.asarray(dxy, dtype = float)), np.atleast_2d(np.asarray(positions, dtype = float)))
+    n = len(d)
+    w0 = np.broadcast_to(np.asarray(width, dtype = float), (n,))
+    w1 = w0 if width_end is False else np.broadcast_to(np.asarray(width_end, dtype = float), (n,))
+
+    # Unit normal of every line
+    nrm = np.stack([-d[:, 1], d[:, 0]], axis = 1) / np.hypot(d[:, 0], d[:, 1])[:, None]
+    verts = np.stack([nrm * w0[:, None] / 2, d + nrm * w1[:, None] / 2, d - nrm * w1[:, None] / 2, -nrm * w0[:, None] / 2], axis = 1) + pos[:, None, :]
+
+    ends = {'A': pos, 'B': pos + d}
+    epsz = {'A': w0, 'B': w1}
+
+    return gtools.classes.StructureArray(verts, ends, epsz, layer = layer, datatype = datatype)
 
 #================================================
 # Generate a meander \\ Author: Marta Pita Vidal \\
 #=========================================================================
-# Arguments:    n               :   number of meanders                  ||
+# The centreline (straights and arcs) is computed in one go with NumPy  ||
+# and every piece becomes one polygon of a single PolygonSet. Give      ||
+# length to solve for the meander that has this centreline length, with ||
+# exactly one of n, meander_length, max_width or max_height and None    ||
+# for the others, e.g.                                                  ||
+#   meander(None, 2, 5, None, 10, length = 1000, max_width = 300)       ||
+# See solve_meander().                                                  ||
+#                                                                       ||
+# Arguments:    n               :   number of meanders (None to solve)  ||
 #               width           :   width of the meander path           ||
 #               radius          :   radius of the corner circles        ||
-#               meander_length  :   length from corner to corner        ||
+#               meander_length  :   length from corner to corner (None  ||
+#                                   to solve)                           ||
 #               connect_length  :   length of initial transmission line ||
 #    (optional) layer           :   layer to put meander on             ||
+#               length          :   target total centreline length      ||
+#               max_width       :   maximum outer width of the meander  ||
+#               max_height      :   maximum outer height of the meander ||
+#               tolerance       :   maximum deviation of arcs           ||
+#               max_points      :   maximum points per polygon          ||
+#=========================================================================
+def meander(n, width, radius, meander_length, connect_length, layer = 0, length = None, max_width = None, max_height = None, tolerance = 0.01, max_points = 199, datatype = 0):
+
+    args = {'n': n, 'width': width, 'radius': radius, 'meander_length': meander_length, 'connect_length': connect_length, 'layer': layer,
+            'length': length, 'max_width': max_width, 'max_height': max_height, 'tolerance': tolerance, 'max_points': max_points, 'datatype': datatype}
+
+    if length == None and (n == None or meander_length == None):
+        raise ValueError('Give both n and meander_length, or length to solve for them')
+
+    if length != None:
+        n, meander_length = solve_meander(length, width, radius, connect_length, n = n, meander_length = meander_length, max_width = max_width, max_height = max_height)
+        n, meander_length = int(n), float(meander_length)
+
+    polys, end = meander_polygons(n, width, radius, meander_length, connect_length, tolerance = tolerance)
+
+    poly = gd.PolygonSet(polys, layer = layer, datatype = datatype)
+    if max(len(p) for p in polys) > max_points:
+        poly.fracture(max_points)
+
+    return gtools.classes.GDStructure(poly, {'A': (0, 0), 'B': end}, {'A': width, 'B': width}, method = meander, args = args)
+
+#========================
+# Generate many meanders \\
+#=========================================================================
+# Batch version of meander(): lengths is a list of target lengths, all  ||
+# other arguments are shared (or lists of the same size). Parameters of ||
+# all meanders are solved at once.                                      ||
 #=========================================================================
-def meander(n, width, radius, meander_length, connect_length, layer = 0):
+def meanders(lengths, width, radius, connect_length, n = None, meander_length = None, max_width = None, max_height = None, layer = 0, tolerance = 0.01, max_points = 199, datatype = 0):
+
+    lengths = np.atleast_1d(np.asarray(lengths, dtype = float))
+    ns, mls = solve_meander(lengths, width, radius, connect_length, n = n, meander_length = meander_length, max_width = max_width, max_height = max_height)
 
-    # Aliases
-    w = width
-    d = radius
-    N = n
-    position = (0, 0)
-    xMeander = meander_length / 2
-    yBase = connect_length
+    w, d, c = [np.broadcast_to(np.asarray(v, dtype = float), lengths.shape) for v in [width, radius, connect_length]]
 
-    # Start path
-    meander_path = gd.Path(w, (0, 0))
-    meander_path.segment(yBase, np.pi/2, layer = layer).turn(w/2, 'r', layer = layer).segment(xMeander - w/2, layer = layer).turn(d, 'll', layer = layer).segment(xMeander, layer = layer)
+    # Record the length and the constraint that was given, as meander(length = ...) does, so regenerate() solves again
+    given = {k: np.broadcast_to(np.asarray(v), lengths.shape) for k, v in [('n', n), ('meander_length', meander_length), ('max_width', max_width), ('max_height', max_height)] if v is not None}
+
+    out = []
+    for i in range(len(lengths)):
+        s = meander(int(ns[i]), w[i], d[i], mls[i], c[i], layer = layer, tolerance = tolerance, max_points = max_points, datatype = datatype)
+        s.args.n = None
+        s.args.meander_length = None
+        s.args.length = lengths[i]
+        for k, v in given.items():
+            setattr(s.args, k, v[i].item())
+        out.append(s)
+
+    return out
+
+#=======================================
+# Solve meander parameters for a length \\
+#=========================================================================
+# The centreline length of a meander is                                 ||
+#   2 c - w + pi w / 2 + 2 n (meander_length + pi r)                    ||
+# and its outer size is (meander_length + 2 r + w) x (2 c + w + 4 n r). ||
+# Give one of n, meander_length, max_width or max_height (the others    ||
+# are solved for), giving more than one raises a ValueError. Works on   ||
+# arrays of lengths.                                                    ||
+#                                                                       ||
+# Returns (n, meander_length)                                           ||
+#=========================================================================
+def solve_meander(length, width, radius, connect_length, n = None, meander_length = None, max_width = None, max_height = None):
+
+    length = np.asarray(length, dtype = float)
+    w, d, c = width, radius, connect_length
+    base = length - (2*c - w + np.pi*w/2)
+
+    given = [k for k, v in [('n', n), ('meander_length', meander_length), ('max_width', max_width), ('max_height', max_height)] if v is not None]
+    if len(given) > 1:
+        raise ValueError('Only one of n, meander_length, max_width or max_height can be given to solve the meander for a length, got ' + ', '.join(given))
+
+    if n != None:
+        n = np.broadcast_to(np.asarray(n), length.shape)
+    elif meander_length != None:
+        n = np.ceil(base / (2*np.asarray(meander_length) + 2*np.pi*d))
+    elif max_width != None:
+        n = np.ceil(base / (2*(np.asarray(max_width) - w - 2*d) + 2*np.pi*d))
+    elif max_height != None:
+        n = np.floor((np.asarray(max_height) - 2*c - w) / (4*d))
+    else:
+        raise ValueError('Give one of n, meander_length, max_width or max_height to solve the meander for a length')
 
-    # Generate periodic meanders
-    for i in range(N - 1):
-        meander_path.segment(xMeander, layer = layer).turn(d, 'rr', layer = layer).segment(2 * xMeander, layer = layer).turn(d, 'll', layer = layer).segment(xMeander, layer = layer)
+    n = np.broadcast_to(np.maximum(n, 1), length.shape).astype(int)
+    ml = base / (2*n) - np.pi*d
 
-    # Finalize
-    meander_path.segment(xMeander, layer = layer).turn(d, 'rr', layer = layer).segment(xMeander - w/2, layer = layer).turn(w/2, 'l', layer = layer).segment(yBase, '+y', layer = layer)
+    if np.any(ml < w):
+        raise ValueError('Length is too short for a meander with these parameters, meander_length would be smaller than the width')
 
-    # Create object
-    struct = gtools.classes.GDStructure(meander_path, {'A': (0, 0), 'B': (meander_path.x, meander_path.y)}, {'A': w, 'B': w})
+    return n, ml
 
-    return struct
+#=============================
+# Meander outline as polygons \\
+#=========================================================================
+# Returns (list of polygons, (x, y) of endpoint B)                      ||
+#=========================================================================
+def meander_polygons(n, width, radius, meander_length, connect_length, tolerance = 0.01):
+
+    w, d, c = width, radius, connect_length
+    xm = meander_length / 2
+
+    # Pieces of the centreline: radius (0 for straights), turn angle and straight length
+    turns = np.pi * (1 - 2*(np.arange(2*n) % 2))
+    rad = np.concatenate([[0, w/2, 0], np.stack([np.full(2*n, d), np.zeros(2*n)], axis = 1).ravel()[:-1], [0, w/2, 0]])
+    ang = np.concatenate([[0, -np.pi/2, 0], np.stack([turns, np.zeros(2*n)], axis = 1).ravel()[:-1], [0, np.pi/2, 0]])
+    lng = np.concatenate([[c, 0, xm - w/2], np.stack([np.zeros(2*n), np.full(2*n, 2*xm)], axis = 1).ravel()[:-1], [xm - w/2, 0, c]])
+
+    # Heading at the start of every piece and displacement over it
+    head = np.pi/2 + np.concatenate([[0], np.cumsum(ang)[:-1]])
+    sgn = np.sign(ang)
+    dx = np.where(rad > 0, sgn*rad*(np.sin(head + ang) - np.sin(head)), lng*np.cos(head))
+    dy = np.where(rad > 0, sgn*rad*(np.cos(head) - np.cos(head + ang)), lng*np.sin(head))
+    start = np.stack([np.concatenate([[0], np.cumsum(dx)[:-1]]), np.concatenate([[0], np.cumsum(dy)[:-1]])], axis = 1)
+    end = (float(np.sum(dx)), float(np.sum(dy)))
+
+    polys = []
+
+    # Straights: one rectangle each
+    st = np.flatnonzero((rad == 0) & (lng > 0))
+    nrm = np.stack([-np.sin(head[st]), np.cos(head[st])], axis = 1) * w/2
+    p0 = start[st]
+    p1 = p0 + np.stack([dx[st], dy[st]], axis = 1)
+    polys += list(np.stack([p0 + nrm, p0 - nrm, p1 - nrm, p1 + nrm], axis = 1))
+
+    # Arcs: all arcs with the same radius are sampled at once
+    for r in np.unique(rad[rad > 0]):
+        ar = np.flatnonzero(rad == r)
+        ro, ri = r + w/2, max(r - w/2, 0)
+        npts = int(np.ceil(np.pi / (2*np.arccos(max(1 - tolerance/ro, -1))))) + 1
+        npts = max(npts, 3)
+
+        cen = start[ar] + (sgn[ar]*r)[:, None] * np.stack([-np.sin(head[ar]), np.cos(head[ar])], axis = 1)
+        a0 = head[ar] - sgn[ar]*np.pi/2
+        t = a0[:, None] + ang[ar][:, None] * np.linspace(0, 1, npts)[None, :]
+        arc = np.stack([np.cos(t), np.sin(t)], axis = -1)
+
+        outer = cen[:, None, :] + ro*arc
+        inner = cen[:, None, :] + ri*arc[:, ::-1] if ri > 0 else cen[:, None, :]
+        polys += list(np.concatenate([outer, inner], axis = 1))
+
+    return polys, end
 
 #===================================
 # Make a transmission line splitter \\
@@ -70,32 +226,94 @@ def meander(n, width, radius, meander_length, connect_length, layer = 0):
 #               space   :   spacing between splits                      ||
 #    (optional) layer   :   choose layer to put split onto              ||
 #=========================================================================
-def splitter(n, width, length, space, layer = 0):
+def splitter(n, width, length, space, layer = 0, datatype = 0):
+
+    polys, outs = splitter_polygons(n, width, length, space)
+
+    ends = {'A': (0, -width / 2)}
+    epsz = {'A': width}
+    for i, o in enumerate(outs.tolist()):
+        ends[gtools.funcs.label(i + 1)] = tuple(o)
+        epsz[gtools.funcs.label(i + 1)] = width
+
+    poly = gd.PolygonSet(polys, layer = layer, datatype = datatype)
+
+    return gtools.classes.GDStructure(poly, ends, epsz, method = splitter, args = {'n': n, 'width': width, 'length': length, 'space': space, 'layer': layer, 'datatype': datatype})
+
+#==========================
+# Make a tree of splitters \\
+#=========================================================================
+# Every output of a splitter feeds the next level, e.g. fanouts [4, 8]  ||
+# gives 32 outputs. The spacing of all but the last level is chosen so  ||
+# that neighbouring subtrees are space apart. All splitters of a level  ||
+# are placed at once.                                                   ||
+#                                                                       ||
+# Arguments:    fanouts :   list with number of splits per level        ||
+#               width   :   width of the paths                          ||
+#               length  :   length of a splitter, or list per level     ||
+#               space   :   spacing between outputs of the last level   ||
+#    (optional) layer   :   choose layer to put tree onto               ||
+#=========================================================================
+def splitter_tree(fanouts, width, length, space, layer = 0, datatype = 0):
 
-    p = [(0, 0), (length / 2 - width / 2, 0), (length / 2 - width / 2, (n*width + (n-1)*space)/2 - width / 2)]
+    levels = len(fanouts)
+    lengths = np.broadcast_to(np.asarray(length, dtype = float), (levels,))
+
+    # Spacing per level, from the leaves up: each output needs room for the subtree behind it
+    spaces = [space] * levels
+    height = fanouts[-1] * width + (fanouts[-1] - 1) * space
+    for k in range(levels - 2, -1, -1):
+        spaces[k] = height + space - width
+        height = fanouts[k] * width + (fanouts[k] - 1) * spaces[k]
+
+    polys = []
+    inputs = np.zeros((1, 2))
+    for k in range(levels):
+        ps, outs = splitter_polygons(fanouts[k], width, lengths[k], spaces[k])
+        for p in ps:
+            polys += list(p[None, :, :] + inputs[:, None, :])
+
+        # Outputs of this level, in order from top to bottom, become the inputs of the next
+        outputs = (inputs[:, None, :] + outs[None, :, :]).reshape(-1, 2)
+        inputs = outputs + np.array([0, width / 2])
 
     ends = {'A': (0, -width / 2)}
     epsz = {'A': width}
+    for i, o in enumerate(outputs.tolist()):
+        ends[gtools.funcs.label(i + 1)] = tuple(o)
+        epsz[gtools.funcs.label(i + 1)] = width
 
-    for i in range(0, n):
-        p += [(length, (n*width + (n-1)*space)/2 - i*(space + width) - width / 2)]
+    poly = gd.PolygonSet(polys, layer = layer, datatype = datatype)
 
-        ends[gtools.alphabet[i + 1]] = (length, p[-1][1] - width / 2)
-        epsz[gtools.alphabet[i + 1]] = width
+    return gtools.classes.GDStructure(poly, ends, epsz, method = splitter_tree, args = {'fanouts': fanouts, 'width': width, 'length': length, 'space': space, 'layer': layer, 'datatype': datatype})
+
+#=========================
+# Splitter outline points \\
+#=========================================================================
+# Returns (list of polygons, (n, 2) array of output endpoints). The     ||
+# outline is one polygon, unless it has more points than the GDSII      ||
+# limit, then it is split into input arm, trunk and branch rectangles.  ||
+#=========================================================================
+def splitter_polygons(n, width, length, space):
 
-        p += [(length, (n*width + (n-1)*space)/2 - i*(space + width) - width - width / 2)]
-        p += [(length / 2 + width / 2, (n*width + (n-1)*space)/2 - i*(space + width) - width - width / 2)]
-        p += [(length / 2 + width / 2, (n*width + (n-1)*space)/2 - i*(space + width) - width - space - width / 2)]
+    w, l, s = width, length, space
+    top = (n*w + (n-1)*s)/2 - np.arange(n)*(s + w) - w/2
+    outs = np.stack([np.full(n, l), top - w/2], axis = 1)
 
-    p = p[:-1]
+    if 4*n + 5 <= 8190:
+        x = np.array([l, l, l/2 + w/2, l/2 + w/2])
+        branch = np.stack([np.broadcast_to(x, (n, 4)), np.stack([top, top - w, top - w, top - w - s], axis = 1)], axis = -1).reshape(-1, 2)[:-1]
+        p = np.concatenate([[(0, 0), (l/2 - w/2, 0), (l/2 - w/2, top[0])], branch, [(l/2 - w/2, top[-1] - w), (l/2 - w/2, -w), (0, -w)]])
+        return [p], outs
 
-    p += [(length / 2 - width / 2, (n*width + (n-1)*space)/2 - (n-1)*(space + width) - width - width / 2)]
-    p += [(length / 2 - width / 2, -width)]
-    p += [(0, -width)]
+    def rect(x0, y0, x1, y1):
+        return np.stack([np.stack([x0, y0], -1), np.stack([x0, y1], -1), np.stack([x1, y1], -1), np.stack([x1, y0], -1)], axis = -2)
 
-    poly = gd.Polygon(p, layer = layer)
+    arm = rect(0, -w, l/2 - w/2, 0)
+    trunk = rect(l/2 - w/2, top[-1] - w, l/2 + w/2, top[0])
+    branches = rect(np.full(n, l/2 + w/2), top - w, np.full(n, l), top)
 
-    return gtools.classes.GDStructure(poly, ends, epsz)
+    return [arm, trunk] + list(branches), outs
 
 # Helper function, returns indeces of neighbouring points (u, d, l, r) in a grid
 def lookaround(index, row_len, pref = 'y'):
@@ -105,19 +323,244 @@ def lookaround(index, row_len, pref = 'y'):
     n.append(index + row_len)
     if index % row_len != 0:
         n.append(index - 1)
-    n.append(index + 1)
+    if (index + 1) % row_len != 0:
+        n.append(index + 1)
 
     if pref == 'x':
         n = n[::-1]
 
     return n
 
+#===========================================
+# Generate a non-uniform (Hanan) route grid \\
+#=========================================================================
+# Places grid lines only where the route can change direction: at the   ||
+# edges of all obstacles grown by clearance and at the endpoints, with  ||
+# one extra line halfway between neighbouring lines so that obstacles   ||
+# in between are seen by router(). For Manhattan obstacles the grid     ||
+# contains a valid route whenever one with the clearance exists.        ||
+#                                                                       ||
+# Arguments:    cell        :   gdspy cell containing the obstacles     ||
+#               fr, to      :   (x, y) start and end points             ||
+#               clearance   :   minimum distance from route centreline  ||
+#                               to obstacles, i.e. width / 2 + spacing  ||
+#    (optional) border      :   extra space around fr and to, defaults  ||
+#                               to the obstacles in between them        ||
+#               layer       :   only use obstacles on this layer        ||
+#               max_step    :   split grid spacings larger than this    ||
+#=========================================================================
+def hanan_grid(cell, fr, to, clearance, border = None, layer = None, max_step = None, precision = 0.001):
+
+    xs = [fr[0], to[0]]
+    ys = [fr[1], to[1]]
+    box = np.array([[min(xs), min(ys)], [max(xs), max(ys)]], dtype = float)
+
+    polys = cell.get_polygons(by_spec = True)
+    polys = [p for spec, ps in polys.items() if layer == None or spec[0] == layer for p in ps]
+
+    # Grow obstacles by clearance, miter joins keep Manhattan corners exact
+    grown = gd.offset(polys, clearance, join = 'miter', tolerance = 2, precision = precision) if polys and clearance > 0 else None
+    grown = grown.polygons if grown != None else polys
+
+    if border == None:
+        # Include everything that overlaps the fr-to box, so the route can go around it
+        region = box.copy()
+        for g in grown:
+            gmin, gmax = np.min(g, axis = 0), np.max(g, axis = 0)
+            if np.all(gmax >= box[0]) and np.all(gmin <= box[1]):
+                region[0] = np.minimum(region[0], gmin)
+                region[1] = np.maximum(region[1], gmax)
+        region += np.array([[-clearance], [clearance]])
+    else:
+        region = box + np.array([[-border], [border]])
+
+    lines = []
+    for axis, ends in [(0, xs), (1, ys)]:
+        v = [region[0][axis], region[1][axis]] + ends
+        for g in grown:
+            v += g[:, axis].tolist()
+        v = np.unique(np.round(v, int(-np.log10(precision))))
+        v = v[(v >= region[0][axis]) & (v <= region[1][axis])]
+
+        # Midpoints, so the grid sees obstacles between two lines
+        mid = (v[1:] + v[:-1]) / 2
+        v = np.sort(np.concatenate([v, mid]))
+
+        if max_step != None:
+            steps = np.maximum(np.ceil(np.diff(v) / max_step).astype(int), 1)
+            v = np.concatenate([np.linspace(v[i], v[i + 1], steps[i], endpoint = False) for i in range(len(v) - 1)] + [v[-1:]])
+
+        lines.append(v)
+
+    return lines[0], lines[1]
+
+class RouteTrace:
+
+    def __init__(self, xr = [], yr = [], labels = None, inside = None, start = [], end = [], backtrace = [], found = False, steps = 0):
+        """Record of a router() run, filled in by router(..., trace = RouteTrace())
+
+        Args:
+            xr, yr (numpy.ndarray): x and y coordinates of the grid lines.
+            labels (numpy.ndarray): (len(yr), len(xr)) wavefront step at which each grid point was reached, -1 for obstacles that were hit, 0 if never reached.
+            inside (numpy.ndarray): (len(yr), len(xr)) obstacle mask.
+            start, end (numpy.ndarray): flat grid indices of the start and end points.
+            backtrace (numpy.ndarray): flat grid indices of the route, from end to start (empty if no route was found).
+            found (bool): whether a route was found.
+            steps (int): number of wavefront steps taken.
+
+        With debug = True the router also sets .trace on the structure it returns. A
+        failed route returns False, so only a trace passed as trace= survives it.
+        """
+
+        self.record(xr, yr, labels, inside, start, end, backtrace, found, steps)
+
+    def __repr__(self):
+        return 'RouteTrace({} x {} grid, {} steps, {} reached, {})'.format(len(self.xr), len(self.yr), self.steps, int(np.sum(self.labels > 0)), 'found' if self.found else 'no route')
+
+    # Overwrite the trace with a new run, see __init__()
+    def record(self, xr, yr, labels = None, inside = None, start = [], end = [], backtrace = [], found = False, steps = 0):
+
+        self.xr = np.asarray(xr, dtype = float)
+        self.yr = np.asarray(yr, dtype = float)
+        self.labels = np.zeros((len(self.yr), len(self.xr)), dtype = int) if labels is None else labels
+        self.inside = np.zeros((len(self.yr), len(self.xr)), dtype = bool) if inside is None else inside
+        self.start = np.asarray(start, dtype = int)
+        self.end = np.asarray(end, dtype = int)
+        self.backtrace = np.asarray(backtrace, dtype = int)
+        self.found = found
+        self.steps = steps
+
+        return self
+
+    # Coordinates of the backtraced route
+    def points(self):
+        return np.stack([self.xr[self.backtrace % len(self.xr)], self.yr[self.backtrace // len(self.xr)]], axis = -1)
+
+    #========================
+    # Render trace to pixels \\
+    #=========================================================================
+    # One pixel per grid point, north up. Obstacles are dark grey, points   ||
+    # that were never reached white, the wavefront goes from blue (early)   ||
+    # to yellow (late), the route is red, start green and end magenta.      ||
+    #                                                                       ||
+    # Returns (len(yr), len(xr), 3) uint8 array                             ||
+    #=========================================================================
+    def image(self):
+
+        lyr, lxr = self.labels.shape
+        img = np.full((lyr, lxr, 3), 255, dtype = np.uint8)
+
+        reached = self.labels > 0
+        if np.any(reached):
+            f = (self.labels[reached] / max(self.steps, 1))[:, None]
+            img[reached] = ((1 - f) * np.array([40, 60, 200]) + f * np.array([250, 220, 30])).astype(np.uint8)
+
+        img[self.inside] = (60, 60, 60)
+
+        for idx, c in [(self.backtrace, (220, 0, 0)), (self.start, (0, 180, 0)), (self.end, (200, 0, 200))]:
+            img[idx // lxr, idx % lxr] = c
+
+        # Image rows go from top to bottom
+        return img[np.argsort(-self.yr, kind = 'stable')][:, np.argsort(self.xr, kind = 'stable')]
+
+    #=============
+    # Save as PNG \\
+    #=========================================================================
+    # Arguments:    filename    :   file to write the image to              ||
+    #    (optional) scale       :   pixels per grid point                   ||
+    #=========================================================================
+    def save_image(self, filename, scale = 1):
+
+        img = np.repeat(np.repeat(self.image(), scale, axis = 0), scale, axis = 1)
+        write_png(filename, img)
+
+        return filename
+
+    #======================
+    # Heatmap of wavefront \\
+    #=========================================================================
+    # Adds the wavefront to cell as one PolygonSet per level, with the      ||
+    # level as datatype (0 for obstacles, 1..levels for the wavefront and   ||
+    # levels + 1 for the route). Equal neighbours in a row are merged.      ||
+    #                                                                       ||
+    # Arguments:    cell    :   gdspy cell to add the heatmap to            ||
+    #    (optional) layer   :   layer to put the heatmap on                 ||
+    #               levels  :   number of wavefront levels                  ||
+    #=========================================================================
+    def heatmap(self, cell, layer = 10, levels = 16):
+
+        lyr, lxr = self.labels.shape
+        lev = np.full((lyr, lxr), -1, dtype = int)
+        reached = self.labels > 0
+        lev[reached] = 1 + (self.labels[reached] - 1) * levels // max(self.steps, 1)
+        lev[self.inside] = 0
+        lev.flat[self.backtrace] = levels + 1
+
+        # Each grid point covers the space halfway to its neighbours
+        def edges(v):
+            o = np.argsort(v, kind = 'stable')
+            sv = v[o]
+            mid = (sv[1:] + sv[:-1]) / 2
+            lo = np.concatenate([[sv[0] - (mid[0] - sv[0] if len(mid) else 0.5)], mid])
+            hi = np.concatenate([mid, [sv[-1] + (sv[-1] - mid[-1] if len(mid) else 0.5)]])
+            return o, lo, hi
+
+        ox, xlo, xhi = edges(self.xr)
+        oy, ylo, yhi = edges(self.yr)
+        lev = lev[oy][:, ox]
+
+        polys = {l: [] for l in range(levels + 2)}
+        for j in range(lyr):
+            row = lev[j]
+            cuts = np.flatnonzero(np.diff(row)) + 1
+            for a, b in zip(np.concatenate([[0], cuts]), np.concatenate([cuts, [lxr]])):
+                if row[a] >= 0:
+                    polys[row[a]].append([(xlo[a], ylo[j]), (xhi[b - 1], ylo[j]), (xhi[b - 1], yhi[j]), (xlo[a], yhi[j])])
+
+        out = [gd.PolygonSet(v, layer = layer, datatype = l) for l, v in polys.items() if v]
+        cell.add(out)
+
+        return out
+
+#==========================
+# Write RGB image to a PNG \\
+#=========================================================================
+# Arguments:    filename    :   file to write to                        ||
+#               img         :   (height, width, 3) uint8 array          ||
+#=========================================================================
+def write_png(filename, img):
+
+    img = np.ascontiguousarray(img, dtype = np.uint8)
+    h, w = img.shape[:2]
+
+    def chunk(tag, data):
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+    raw = np.concatenate([np.zeros((h, 1), dtype = np.uint8), img.reshape(h, w * 3)], axis = 1).tobytes()
+
+    with open(filename, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 8, 2, 0, 0, 0)))
+        f.write(chunk(b'IDAT', zlib.compress(raw, 6)))
+        f.write(chunk(b'IEND', b''))
+
+    return filename
+
 # Autoroute using Lee's routing algorithm
-def router(cell, fr_str, fr_ep, to_str, to_ep, width, bmul, grid_s = 1, xr = False, yr = False, uniform_width = False, precision = 0.001, pref = 'y', switch_pref = False, layer = 0, debug = False, nop = 21, dist_multi = 2, pathmethod = 'poly', detect = 'native'):
+# debug = True attaches a RouteTrace to the route as .trace, only trace = RouteTrace() also keeps the trace of a failed route
+def router(cell, fr_str, fr_ep, to_str, to_ep, width, bmul, grid_s = 1, xr = False, yr = False, uniform_width = False, precision = 0.001, pref = 'y', switch_pref = False, layer = 0, debug = False, nop = 21, dist_multi = 2, pathmethod = 'poly', detect = 'native', grid = 'uniform', clearance = 0, drc = None, trace = None):
 
     fr = fr_str.endpoints[fr_ep]
     to = to_str.endpoints[to_ep]
 
+    # Non-uniform grid only at obstacle edges, keep the route centreline clearance away from them
+    if grid == 'hanan':
+        clearance = clearance if clearance else width / 2
+        if type(xr) not in [list, np.ndarray] or type(yr) not in [list, np.ndarray]:
+            xr, yr = hanan_grid(cell, fr, to, clearance, precision = precision)
+    elif grid != 'uniform':
+        raise ValueError('Parameter \'grid\' is only allowed to have values [\'uniform\', \'hanan\'], cannot continue')
+
     border_s = bmul * grid_s
     box = [fr, to]
 
@@ -161,14 +604,24 @@ def router(cell, fr_str, fr_ep, to_str, to_ep, width, bmul, grid_s = 1, xr = Fal
     p_d_fr = np.array(p_d_fr)
     p_d_to = np.array(p_d_to)
 
-    # Build list of points that are inside a structure
-    cell_ref = gd.CellReference(cell)
-    if detect == 'native':
-        inside = np.array(gd.inside(p, cell_ref, precision = precision))
-    elif detect == 'custom':
-        inside = np.array(gtools.funcs.inside(p, cell_ref, dist = dist_multi*grid_s, nop = nop, precision = precision))
+    # A prebuilt query.PolygonIndex of the obstacles is used as is (build it on the grown polygons for clearance), so one index serves many routes in a cell
+    if isinstance(detect, gtools.query.PolygonIndex):
+        inside = detect.inside(p_i)
     else:
-        raise ValueError('Parameter \'detect\' is only allowed to have values [\'native\', \'custom\'], cannot continue')
+        # Build list of points that are inside a structure (grown by clearance, if any)
+        cell_ref = gd.CellReference(cell)
+        if clearance > 0:
+            cell_ref = gd.offset(cell_ref, clearance - 2 * precision, join = 'miter', precision = precision)
+
+        # 'index' does the same exact test as 'native', but only against nearby polygon edges
+        if detect == 'index':
+            inside = gtools.query.PolygonIndex(cell_ref, precision = precision).inside(p_i)
+        elif detect == 'native':
+            inside = np.array(gd.inside(p, cell_ref, precision = precision))
+        elif detect == 'custom':
+            inside = np.array(gtools.funcs.inside(p, cell_ref, dist = dist_multi*grid_s, nop = nop, precision = precision))
+        else:
+            raise ValueError('Parameter \'detect\' is only allowed to have values [\'native\', \'custom\', \'index\'] or a query.PolygonIndex, cannot continue')
 
     p_d_fr_min = np.min(p_d_fr[np.argwhere(inside == False)])
     p_d_to_min = np.min(p_d_to[np.argwhere(inside == False)])
@@ -190,12 +643,19 @@ def router(cell, fr_str, fr_ep, to_str, to_ep, width, bmul, grid_s = 1, xr = Fal
     path_found = False
     k = 0
 
+    # A RouteTrace passed as trace (or made for debug = True) records the run, debug = 'annotate' draws every step in the cell (slow)
+    annotate = debug == 'annotate'
+    hint = debug and not annotate and trace is None
+    if hint:
+        trace = RouteTrace()
+    trace_start = list(start_i)
+
     while not path_found and start_i:
 
         k += 1
         next_start_i = []
 
-        if debug:
+        if annotate:
             print(start_i)
 
         for i in start_i:
@@ -211,7 +671,7 @@ def router(cell, fr_str, fr_ep, to_str, to_ep, width, bmul, grid_s = 1, xr = Fal
                     p_g[nb] = k
                     final_index = nb
 
-                    if debug:
+                    if annotate:
                         # Visualize
                         circ = gd.Round(p[nb], 0.1, layer = 10)
                         cell.add(circ)
@@ -230,7 +690,7 @@ def router(cell, fr_str, fr_ep, to_str, to_ep, width, bmul, grid_s = 1, xr = Fal
                     p_g[nb] = k
                     next_start_i.append(nb)
 
-                    if debug:
+                    if annotate:
                         # Visualize
                         circ = gd.Round(p[nb], 0.1, layer = 1)
                         cell.add(circ)
@@ -239,9 +699,14 @@ def router(cell, fr_str, fr_ep, to_str, to_ep, width, bmul, grid_s = 1, xr = Fal
 
         start_i = copy.copy(next_start_i)
 
+    if trace is not None:
+        trace.record(xr, yr, np.array(p_g).reshape(lyr, lxr), np.asarray(inside, dtype = bool).reshape(lyr, lxr), trace_start, end_i, [], path_found, k)
+
     # Routing ended, checking whether we succeeded
     if not path_found:
         print('>> ERROR: No existing route was found.')
+        if hint:
+            print('>> Pass trace = gtools.routing.RouteTrace() to router() to inspect the failed search, the trace of debug = True only comes with a found route.')
         return False
 
     print('>> Found a route in ' + str(k) + ' steps.')
@@ -249,6 +714,7 @@ def router(cell, fr_str, fr_ep, to_str, to_ep, width, bmul, grid_s = 1, xr = Fal
     # Backtrace path
     this_index = final_index
     backtraced = [to, p[final_index]]
+    backtraced_i = [final_index]
     switched = False
     for this_k in range(k, -1, -1):
 
@@ -259,14 +725,15 @@ def router(cell, fr_str, fr_ep, to_str, to_ep, width, bmul, grid_s = 1, xr = Fal
 
         n = lookaround(this_index, lxr, pref = pref)
         for nb in n:
-            if nb < lp and p_g[nb] == this_k:
+            if 0 <= nb < lp and p_g[nb] == this_k:
                 this_index = nb
                 backtraced.append(p[nb])
+                backtraced_i.append(nb)
                 break
 
     backtraced.append(fr)
 
-    if debug:
+    if annotate:
         print('>> Points of found route:')
         print(backtraced)
 
@@ -297,4 +764,362 @@ def router(cell, fr_str, fr_ep, to_str, to_ep, width, bmul, grid_s = 1, xr = Fal
     structure.prev['AUTOROUTE_A'] = fr_str
     structure.prev['AUTOROUTE_B'] = to_str
 
+    # Check the new route against the rest of the design
+    if drc is not None:
+        drc.check([structure])
+
+    if trace is not None:
+        trace.backtrace = np.array(backtraced_i, dtype = int)
+        if debug:
+            structure.trace = trace
+
     return structure
+
+#=========================
+# Make a via or crossover \\
+#=========================================================================
+# Square pads centred on (0, 0) on every layer in layers, optionally    ||
+# with a smaller cut on cut_layer in between.                           ||
+#                                                                       ||
+# Arguments:    size        :   size of the pads                        ||
+#    (optional) layers      :   layers to put the pads onto             ||
+#               cut_layer   :   layer of the via cut, None for no cut   ||
+#               cut_size    :   size of the cut, defaults to size / 2   ||
+#=========================================================================
+def via(size, layers = [0, 1], cut_layer = None, cut_size = None, datatype = 0):
+
+    cut_size = size / 2 if cut_size == None else cut_size
+    square = np.array([(-1, -1), (1, -1), (1, 1), (-1, 1)], dtype = float) / 2
+
+    polys = [square * size for l in layers]
+    specs = list(layers)
+    if cut_layer != None:
+        polys.append(square * cut_size)
+        specs.append(cut_layer)
+
+    poly = gd.PolygonSet(polys)
+    poly.layers = specs
+    poly.datatypes = [datatype] * len(specs)
+
+    ends = {'A': (0, 0), 'B': (0, 0)}
+    epsz = {'A': size, 'B': size}
+
+    return gtools.classes.GDStructure(poly, ends, epsz, method = via, args = {'size': size, 'layers': layers, 'cut_layer': cut_layer, 'cut_size': cut_size, 'datatype': datatype})
+
+class ObstacleGrid:
+
+    def __init__(self, cell, layers, xr, yr, grow = 0, precision = 0.001, tile = 64):
+        """Obstacle masks of a routing grid, one per layer, evaluated lazily in tiles
+
+        Args:
+            cell (gdspy.Cell): cell containing the obstacles.
+            layers (list): layers to keep a mask for, only polygons on a layer are obstacles on that layer.
+            xr, yr (numpy.ndarray): increasing x and y coordinates of the grid lines.
+            grow (float, optional): grow the obstacles by this distance, e.g. the clearance of the route. Defaults to 0.
+            precision (float, optional): precision of the inside test and the growing. Defaults to 0.001.
+            tile (int, optional): masks are evaluated in blocks of tile x tile grid points. Defaults to 64.
+
+        A tile is only evaluated when the router first looks at one of its points and
+        tiles without obstacles are not stored, so memory scales with the explored part
+        of the grid that has obstacles on it instead of layers x len(yr) x len(xr).
+        """
+
+        self.layers = layers
+        self.xr = np.asarray(xr, dtype = float)
+        self.yr = np.asarray(yr, dtype = float)
+        self.tile = tile
+
+        self._tiles = {}
+        self._index = []
+        for l in layers:
+            polys = gtools.query.gather(cell, layer = l)
+            if polys and grow > 0:
+                grown = gd.offset(polys, grow - 2 * precision, join = 'miter', precision = precision)
+                polys = grown.polygons if grown != None else []
+            self._index.append(gtools.query.PolygonIndex(polys, precision = precision))
+
+    def __len__(self):
+        return len(self._tiles)
+
+    # Bytes used by the evaluated masks
+    def nbytes(self):
+        return sum(m.nbytes for m in self._tiles.values() if m is not None)
+
+    #========================
+    # Obstacle at grid point \\
+    #=========================================================================
+    # Arguments:    l       :   index of the layer in layers                ||
+    #               i, j    :   row (index in yr) and column (index in xr)  ||
+    #=========================================================================
+    def blocked(self, l, i, j):
+
+        t = self.tile
+        key = (l, i // t, j // t)
+        mask = self._tiles[key] if key in self._tiles else self._evaluate(key)
+
+        return mask is not None and mask[i % t, j % t]
+
+    def _evaluate(self, key):
+
+        l, ti, tj = key
+        t = self.tile
+        xs = self.xr[tj * t:(tj + 1) * t]
+        ys = self.yr[ti * t:(ti + 1) * t]
+        index = self._index[l]
+
+        # Only test tiles that overlap the bounding box of an obstacle
+        b = index.bbox
+        mask = None
+        if np.any((b[:, 0] <= xs[-1]) & (b[:, 2] >= xs[0]) & (b[:, 1] <= ys[-1]) & (b[:, 3] >= ys[0])):
+            x, y = np.meshgrid(xs, ys)
+            mask = index.inside(np.stack([x.ravel(), y.ravel()], axis = 1)).reshape(len(ys), len(xs))
+            mask = mask if np.any(mask) else None
+
+        self._tiles[key] = mask
+
+        return mask
+
+    #=========================
+    # Closest free grid point \\
+    #=========================================================================
+    # Arguments:    l       :   index of the layer in layers                ||
+    #               point   :   (x, y) to search around                     ||
+    #                                                                       ||
+    # Returns (i, j) of the closest grid point outside all obstacles on l,  ||
+    # or None if there is none                                              ||
+    #=========================================================================
+    def nearest_free(self, l, point):
+
+        xr, yr = self.xr, self.yr
+        ci, cj = np.searchsorted(yr, point[1]), np.searchsorted(xr, point[0])
+
+        n = 2
+        while True:
+            i0, i1 = max(ci - n, 0), min(ci + n, len(yr))
+            j0, j1 = max(cj - n, 0), min(cj + n, len(xr))
+
+            i, j = np.meshgrid(np.arange(i0, i1), np.arange(j0, j1), indexing = 'ij')
+            i, j = i.ravel(), j.ravel()
+            d = np.hypot(xr[j] - point[0], yr[i] - point[1])
+
+            # Grid points outside the window are at least this far away
+            reach = min(point[0] - xr[j0 - 1] if j0 > 0 else np.inf, xr[j1] - point[0] if j1 < len(xr) else np.inf,
+                        point[1] - yr[i0 - 1] if i0 > 0 else np.inf, yr[i1] - point[1] if i1 < len(yr) else np.inf)
+
+            for k in np.argsort(d, kind = 'stable'):
+                if d[k] > reach:
+                    break
+                if not self.blocked(l, i[k], j[k]):
+                    return int(i[k]), int(j[k])
+
+            if reach == np.inf:
+                return None
+
+            n *= 2
+
+#==============================================
+# Remove repeated and collinear points of path \\
+#=========================================================================
+# Arguments:    points  :   list of (x, y) points                       ||
+#=========================================================================
+def corners(points):
+
+    p = np.asarray(points, dtype = float).reshape(-1, 2)
+    p = p[np.concatenate([[True], np.any(np.diff(p, axis = 0) != 0, axis = 1)])]
+
+    if len(p) > 2:
+        a, b = p[1:-1] - p[:-2], p[2:] - p[1:-1]
+        straight = (a[:, 0] * b[:, 1] == a[:, 1] * b[:, 0]) & (np.sum(a * b, axis = 1) > 0)
+        p = p[np.concatenate([[True], ~straight, [True]])]
+
+    return p
+
+#==================================
+# Autoroute across multiple layers \\
+#=========================================================================
+# A* search on a stack of grids, one per layer in layers, with a        ||
+# separate obstacle mask per layer (see ObstacleGrid). Moving to the    ||
+# next or previous layer in layers costs via_cost (in units of length)  ||
+# and places a via, which needs room on both layers.                    ||
+#                                                                       ||
+# Arguments:    cell        :   gdspy cell containing the obstacles     ||
+#               fr_str      :   GDStructure to route from               ||
+#               fr_ep       :   endpoint of fr_str to route from        ||
+#               to_str      :   GDStructure to route to                 ||
+#               to_ep       :   endpoint of to_str to route to          ||
+#               width       :   width of the route                      ||
+#               bmul        :   border around fr and to, in grid steps  ||
+#               layers      :   routing layers, in stack order          ||
+#    (optional) grid_s      :   grid spacing of the uniform grid        ||
+#               xr, yr      :   custom grid lines                       ||
+#               fr_layer    :   layer at fr, defaults to fr_str layer   ||
+#               to_layer    :   layer at to, defaults to to_str layer   ||
+#               via_cost    :   cost of a layer change                  ||
+#               bend_cost   :   cost of a bend, > 0 avoids staircases   ||
+#               via_size    :   size of the via pads, defaults to width ||
+#               via_layer   :   layer of the via cut, None for no cut   ||
+#               via_method  :   function(layers = [a, b]) returning a   ||
+#                               GDStructure centred on (0, 0) to use    ||
+#                               instead of via()                        ||
+#               grid        :   'uniform' or 'hanan'                    ||
+#               clearance   :   grow obstacles by this distance         ||
+#               tile        :   tile size of the obstacle masks         ||
+#               max_states  :   give up after searching this many       ||
+#               weight      :   > 1 searches faster, but the route can  ||
+#                               cost up to weight times the optimum     ||
+#               drc         :   DRC to check the route with             ||
+#                                                                       ||
+# Returns list of GDStructures (segments and vias) from fr to to, each  ||
+# linked to the next one with next['B'] and prev['A'], or False         ||
+#=========================================================================
+def layer_router(cell, fr_str, fr_ep, to_str, to_ep, width, bmul, layers, grid_s = 1, xr = False, yr = False, fr_layer = None, to_layer = None, via_cost = 10, bend_cost = 0, via_size = None, via_layer = None, via_method = None, precision = 0.001, pathmethod = 'poly', grid = 'uniform', clearance = 0, tile = 64, max_states = None, weight = 1, drc = None):
+
+    fr = fr_str.endpoints[fr_ep]
+    to = to_str.endpoints[to_ep]
+
+    fr_layer = fr_str.getlayer() if fr_layer == None else fr_layer
+    to_layer = to_str.getlayer() if to_layer == None else to_layer
+    for l in [fr_layer, to_layer]:
+        if l not in layers:
+            raise ValueError('Layer ' + str(l) + ' of start or end point is not in parameter \'layers\', cannot continue')
+
+    if pathmethod not in ['poly', 'flex']:
+        raise ValueError('Parameter \'pathmethod\' only has allowed values [\'poly\', \'flex\']')
+
+    # Vias need room for their pads on both layers
+    via_size = width if via_size == None else via_size
+    via_clearance = clearance + max(via_size - width, 0) / 2
+
+    if grid == 'hanan':
+        clearance = clearance if clearance else width / 2
+        via_clearance = max(via_clearance, clearance)
+        if type(xr) not in [list, np.ndarray] or type(yr) not in [list, np.ndarray]:
+            xr, yr = hanan_grid(cell, fr, to, clearance, precision = precision)
+            if via_clearance != clearance:
+                vx, vy = hanan_grid(cell, fr, to, via_clearance, precision = precision)
+                xr, yr = np.union1d(xr, vx), np.union1d(yr, vy)
+    elif grid != 'uniform':
+        raise ValueError('Parameter \'grid\' is only allowed to have values [\'uniform\', \'hanan\'], cannot continue')
+
+    border_s = bmul * grid_s
+    lo = np.minimum(fr, to) - border_s
+    hi = np.maximum(fr, to) + border_s
+
+    if type(xr) not in [list, np.ndarray]:
+        xr = np.linspace(lo[0], hi[0], int((hi[0] - lo[0]) / grid_s) + 1)
+    if type(yr) not in [list, np.ndarray]:
+        yr = np.linspace(lo[1], hi[1], int((hi[1] - lo[1]) / grid_s) + 1)
+
+    xr, yr = np.unique(np.asarray(xr, dtype = float)), np.unique(np.asarray(yr, dtype = float))
+
+    obstacles = ObstacleGrid(cell, layers, xr, yr, clearance, precision = precision, tile = tile)
+    vias = obstacles if via_clearance == clearance else ObstacleGrid(cell, layers, xr, yr, via_clearance, precision = precision, tile = tile)
+
+    l_fr, l_to = layers.index(fr_layer), layers.index(to_layer)
+    start = obstacles.nearest_free(l_fr, fr)
+    end = obstacles.nearest_free(l_to, to)
+
+    if start == None or end == None:
+        print('>> ERROR: No free grid point near the start or end point.')
+        return False
+
+    # A* over states (layer, row, column, direction of last step), 4 is no direction
+    xl, yl = xr.tolist(), yr.tolist()
+    ny, nx, nl = len(yl), len(xl), len(layers)
+    tx, ty = xl[end[1]], yl[end[0]]
+    moves = [(0, 1, 0), (0, -1, 1), (1, 0, 2), (-1, 0, 3)]
+
+    s0 = (l_fr, start[0], start[1], 4)
+    cost = {s0: 0.0}
+    parent = {s0: None}
+    heap = [(weight * (abs(xl[start[1]] - tx) + abs(yl[start[0]] - ty) + via_cost * abs(l_fr - l_to)), 0.0, s0)]
+    closed = set()
+    found = None
+
+    def push(s, c):
+        if c < cost.get(s, np.inf):
+            cost[s] = c
+            parent[s] = current
+            heapq.heappush(heap, (c + weight * (abs(xl[s[2]] - tx) + abs(yl[s[1]] - ty) + via_cost * abs(s[0] - l_to)), -c, s))
+
+    while heap:
+
+        f, c, current = heapq.heappop(heap)
+        if current in closed:
+            continue
+        closed.add(current)
+
+        l, i, j, d = current
+        if l == l_to and i == end[0] and j == end[1]:
+            found = current
+            break
+
+        if max_states != None and len(closed) >= max_states:
+            break
+
+        c = cost[current]
+        for di, dj, nd in moves:
+            ni, nj = i + di, j + dj
+            if ni < 0 or ni >= ny or nj < 0 or nj >= nx or obstacles.blocked(l, ni, nj):
+                continue
+            push((l, ni, nj, nd), c + abs(xl[nj] - xl[j]) + abs(yl[ni] - yl[i]) + (bend_cost if d != 4 and nd != d else 0))
+
+        for nl_ in [l - 1, l + 1]:
+            if 0 <= nl_ < nl and not vias.blocked(l, i, j) and not vias.blocked(nl_, i, j):
+                push((nl_, i, j, 4), c + via_cost)
+
+    if found == None:
+        print('>> ERROR: No existing route was found.')
+        return False
+
+    path = []
+    s = found
+    while s != None:
+        path.append(s)
+        s = parent[s]
+    path.reverse()
+
+    # Split path in runs on one layer, a via goes in between every two runs
+    runs = [[path[0]]]
+    for s in path[1:]:
+        if s[0] != runs[-1][-1][0]:
+            runs.append([])
+        runs[-1].append(s)
+
+    route = []
+    for k, run in enumerate(runs):
+
+        pts = [(xl[s[2]], yl[s[1]]) for s in run]
+        pts = corners(([fr] if k == 0 else []) + pts + ([to] if k == len(runs) - 1 else []))
+
+        if len(pts) >= 2:
+            if pathmethod == 'poly':
+                r = gd.PolyPath(pts, width, layer = layers[run[0][0]])
+            else:
+                r = gd.FlexPath(pts, width, corners = 'smooth', layer = layers[run[0][0]])
+
+            route.append(gtools.classes.GDStructure(r, {'A': tuple(pts[0].tolist()), 'B': tuple(pts[-1].tolist())}, {'A': width, 'B': width}))
+
+        if k < len(runs) - 1:
+            pair = [layers[run[0][0]], layers[runs[k + 1][0][0]]]
+            v = via(via_size, pair, cut_layer = via_layer) if via_method == None else via_method(layers = pair)
+            v.translate(tuple(pts[-1].tolist()))
+            route.append(v)
+
+    # Link the pieces of the route to each other and to 'to' and 'from' structures
+    for a, b in zip(route[:-1], route[1:]):
+        a.next['B'] = b
+        b.prev['A'] = a
+
+    fr_str.next['AUTOROUTE_A'] = route[0]
+    to_str.next['AUTOROUTE_B'] = route[-1]
+    route[0].prev['AUTOROUTE_A'] = fr_str
+    route[-1].prev['AUTOROUTE_B'] = to_str
+
+    print('>> Found a route of length ' + str(round(cost[found], 6)) + ' with ' + str(len(runs) - 1) + ' via(s), ' + str(len(closed)) + ' states searched.')
+
+    # Check the new route against the rest of the design
+    if drc is not None:
+        drc.check(route)
+
+    return route
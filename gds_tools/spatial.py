@@ -0,0 +1,449 @@
+import numpy as np
+import scipy.spatial as sp
+import gds_tools as gtools
+
+class EndpointIndex:
+
+    def __init__(self, objectlist = None, compound = True, leafsize = 16, rebuild = None):
+        """Spatial index (KD-tree) over the endpoints of a set of GDStructures
+
+        Args:
+            objectlist (list, optional): GDStructure objects to index. Defaults to None.
+            compound (bool, optional): also index the members of compound structures. Defaults to True.
+            leafsize (int, optional): leaf size of the scipy KD-tree. Defaults to 16.
+            rebuild (int, optional): number of changed structures that are checked one by one before the KD-tree is rebuilt. Defaults to None (square root of the number of endpoints, at least 32).
+
+        The index keeps itself up to date when indexed structures are moved with
+        .translate(), .rotate() or .mirror(). If you change the endpoints of a
+        structure by hand, call its .moved() method (or index.invalidate(structure)).
+        Changed structures are not taken out of the tree straight away, their old
+        entries are ignored and their new endpoints are searched linearly until
+        there are more than rebuild of them.
+
+        A StructureArray gets one entry per instance and endpoint, results and
+        .structure(row) return the instance arr[i].
+        """
+
+        self.compound = compound
+        self.leafsize = leafsize
+        self.rebuild = rebuild
+        self.structures = []
+
+        self._uid = {}
+        self._objs = {}
+        self._count = 0
+        self._dirty = {}
+        self._extra = None
+        self._tree = None
+
+        self.owners = np.zeros(0, dtype = int)
+        self.instances = np.zeros(0, dtype = int)
+        self.names = np.zeros(0, dtype = object)
+        self.points = np.zeros((0, 2))
+        self.dims = np.zeros(0)
+        self._alive = np.zeros(0, dtype = bool)
+
+        if objectlist:
+            self.add(objectlist)
+
+    def __len__(self):
+        self.refresh()
+        return len(self.points)
+
+    def __contains__(self, structure):
+        return id(structure) in self._uid
+
+    # Owner and instance (-1 for everything but a StructureArray) of a structure
+    def _key(self, structure):
+
+        if isinstance(structure, gtools.classes.StructureView):
+            return self._uid.get(id(structure.array)), structure.index
+
+        return self._uid.get(id(structure)), -1
+
+    #================
+    # Add structures \\
+    #=========================================================================
+    # Arguments:    objectlist  :   GDStructure or list of GDStructures     ||
+    #=========================================================================
+    def add(self, objectlist):
+
+        if type(objectlist) is not type([]):
+            objectlist = [objectlist]
+
+        for i in objectlist:
+            if i in self:
+                continue
+
+            uid = self._count
+            self._count += 1
+
+            self.structures.append(i)
+            self._uid[id(i)] = uid
+            self._objs[uid] = i
+            self._dirty[uid] = None
+            self._extra = None
+            i.__indices__.append(self)
+
+            if self.compound and i.compound:
+                self.add(i.compound)
+
+        return self
+
+    #===================
+    # Remove structures \\
+    #=========================================================================
+    # Arguments:    objectlist  :   GDStructure or list of GDStructures     ||
+    #=========================================================================
+    def remove(self, objectlist):
+
+        if type(objectlist) is not type([]):
+            objectlist = [objectlist]
+
+        ids = set()
+        for i in objectlist:
+            if i not in self:
+                continue
+
+            uid = self._uid.pop(id(i))
+            del self._objs[uid]
+            self._kill(uid)
+            self._dirty.pop(uid, None)
+            ids.add(id(i))
+            i.__indices__.remove(self)
+
+        self.structures = [s for s in self.structures if id(s) not in ids]
+        self._extra = None
+
+        return self
+
+    # Detach from all structures, so their transforms no longer notify the index
+    def close(self):
+        return self.remove(list(self.structures))
+
+    #===========================
+    # Mark structure as changed \\
+    #=========================================================================
+    # Called by GDStructure.moved(), the old endpoints of the structure     ||
+    # are ignored from now on and the new ones are read on the next query.  ||
+    #=========================================================================
+    def invalidate(self, structure):
+
+        uid = self._uid[id(structure)]
+        if uid not in self._dirty:
+            self._kill(uid)
+        self._dirty[uid] = None
+        self._extra = None
+
+        return self
+
+    # Ignore the rows of a structure in the current tree
+    def _kill(self, uid):
+
+        if self._tree is None:
+            return
+
+        lo, hi = np.searchsorted(self.owners, [uid, uid + 1])
+        self._alive[lo:hi] = False
+
+    # Current endpoints of one structure as (instances, names, points, dims)
+    def _read(self, s):
+
+        names = list(s.endpoints.keys())
+
+        # Instance by instance for arrays, so the rows of arr[i] are together
+        if isinstance(s, gtools.classes.StructureArray):
+            n = len(s)
+            pts = np.stack([s.endpoints[k] for k in names], axis = 1).reshape(-1, 2) if names else np.zeros((0, 2))
+            dims = np.stack([s.endpoint_dims[k] if k in s.endpoint_dims else np.full(n, np.nan) for k in names], axis = 1).reshape(-1) if names else np.zeros(0)
+            return np.repeat(np.arange(n), len(names)), names * n, pts, dims
+
+        pts = np.array([s.endpoints[n] for n in names], dtype = float).reshape(-1, 2)
+        dims = np.array([s.endpoint_dims.get(n) if s.endpoint_dims else None for n in names], dtype = float).reshape(-1)
+
+        return np.full(len(names), -1, dtype = int), names, pts, dims
+
+    # Table (owners, instances, names, points, dims) of the changed structures,
+    # only structures that changed since the last call are read again
+    def _table(self):
+
+        owners, inst, names, pts, dims = [], [], [], [], []
+        for uid in sorted(self._dirty):
+            if self._dirty[uid] is None:
+                self._dirty[uid] = self._read(self._objs[uid])
+            i, n, p, d = self._dirty[uid]
+            owners.append(np.full(len(n), uid, dtype = int))
+            inst.append(i)
+            names += n
+            pts.append(p)
+            dims.append(d)
+
+        if not owners:
+            return np.zeros(0, dtype = int), np.zeros(0, dtype = int), np.zeros(0, dtype = object), np.zeros((0, 2)), np.zeros(0)
+
+        out = np.empty(len(names), dtype = object)
+        out[:] = names
+
+        return np.concatenate(owners), np.concatenate(inst), out, np.concatenate(pts), np.concatenate(dims)
+
+    #=================
+    # Rebuild KD-tree \\
+    #=========================================================================
+    # Drops the ignored rows, reads the endpoints of changed structures     ||
+    # and rebuilds the tree in one go. After this, .points, .owners, .names ||
+    # and .dims hold every indexed endpoint.                                ||
+    #=========================================================================
+    def refresh(self):
+
+        if self._tree is not None and not self._dirty and self._alive.all():
+            return self
+
+        keep = self._alive
+        owners, inst, names, pts, dims = self._table()
+
+        owners = np.concatenate([self.owners[keep], owners])
+        order = np.argsort(owners, kind = 'stable')
+
+        # Rows sorted by owner, so they stay in the order the structures were added
+        self.owners = owners[order]
+        self.instances = np.concatenate([self.instances[keep], inst])[order]
+        self.names = np.concatenate([self.names[keep], names])[order]
+        self.points = np.concatenate([self.points[keep], pts])[order]
+        self.dims = np.concatenate([self.dims[keep], dims])[order]
+        self._alive = np.ones(len(self.points), dtype = bool)
+        self._tree = sp.cKDTree(self.points, leafsize = self.leafsize)
+
+        self._dirty = {}
+        self._extra = None
+
+        return self
+
+    # Rebuild only when the linearly searched part gets too large
+    def _update(self):
+
+        limit = self.rebuild if self.rebuild != None else max(32, int(np.sqrt(len(self.points))))
+        if self._tree is None or len(self._dirty) > limit:
+            self.refresh()
+
+        if self._extra is None:
+            self._extra = self._table()
+
+        return self
+
+    # Structure (or array instance) a row of the tree belongs to
+    def structure(self, row):
+        return self._owner(self.owners[row], self.instances[row])
+
+    def _owner(self, uid, i):
+        return self._objs[uid] if i < 0 else self._objs[uid][i]
+
+    def isopen(self, row):
+        return self._isopen(self.owners[row], self.instances[row], self.names[row])
+
+    def _isopen(self, uid, i, name):
+
+        s = self._objs[uid]
+        if name in s.prev or name in s.next:
+            return False
+
+        # Instances only have links once arr[i] was used
+        if i >= 0 and i in s._views:
+            return name not in s._views[i].prev and name not in s._views[i].next
+
+        return True
+
+    # Filter rows of a table by width, open state and excluded structures
+    def _filter(self, table, rows, width = None, width_tol = 1e-9, open_only = False, exclude = None):
+
+        owners, inst, names, pts, dims = table
+        rows = np.asarray(rows, dtype = int)
+
+        if width != None:
+            rows = rows[np.abs(dims[rows] - width) <= width_tol]
+
+        if exclude != None:
+            if type(exclude) is not type([]):
+                exclude = [exclude]
+            ex = [self._key(e) for e in exclude]
+            skip = np.isin(owners[rows], [u for u, i in ex if i < 0 and u != None])
+            for u, i in ex:
+                if i >= 0 and u != None:
+                    skip |= (owners[rows] == u) & (inst[rows] == i)
+            rows = rows[~skip]
+
+        if open_only:
+            rows = rows[[self._isopen(owners[r], inst[r], names[r]) for r in rows]] if len(rows) else rows
+
+        return rows
+
+    def _result(self, table, rows, point):
+        owners, inst, names, pts, dims = table
+        d = np.hypot(*(pts[rows] - point).T)
+        return [(self._owner(owners[r], inst[r]), names[r], float(di)) for r, di in zip(rows, d)]
+
+    # Results of the linearly searched changed structures within r (all if r is None)
+    def _extra_result(self, point, r, *args):
+
+        pts = self._extra[3]
+        rows = np.arange(len(pts))
+        if r != None:
+            rows = rows[np.hypot(*(pts - point).T) <= r]
+
+        return self._result(self._extra, self._filter(self._extra, rows, *args), point)
+
+    #========================
+    # Nearest endpoint query \\
+    #=========================================================================
+    # Arguments:    point       :   (x, y) to search around                 ||
+    #    (optional) k           :   number of endpoints to return           ||
+    #               width       :   only return endpoints of this width     ||
+    #               width_tol   :   tolerance on width comparison           ||
+    #               open_only   :   skip endpoints that are connected       ||
+    #               exclude     :   structure(s) to skip                    ||
+    #                                                                       ||
+    # Returns list of (GDStructure, endpoint name, distance), closest first ||
+    #=========================================================================
+    def nearest(self, point, k = 1, width = None, width_tol = 1e-9, open_only = False, exclude = None):
+
+        self._update()
+        n = len(self.points)
+        point = np.asarray(point, dtype = float)
+        table = (self.owners, self.instances, self.names, self.points, self.dims)
+
+        res = self._extra_result(point, None, width, width_tol, open_only, exclude)
+
+        kk = k
+        while n:
+            kq = min(kk, n)
+
+            d, rows = self._tree.query(point, k = kq)
+            rows = np.atleast_1d(rows)
+            rows = rows[rows < n]
+            rows = self._filter(table, rows[self._alive[rows]], width, width_tol, open_only, exclude)
+
+            if len(rows) >= k or kq == n:
+                res += self._result(table, rows[:k], point)
+                break
+
+            kk *= 4
+
+        return sorted(res, key = lambda x: x[2])[:k]
+
+    #=======================
+    # Radius endpoint query \\
+    #=========================================================================
+    # Arguments:    point   :   (x, y) to search around                     ||
+    #               r       :   search radius                               ||
+    #    (optional) see nearest()                                           ||
+    #                                                                       ||
+    # Returns list of (GDStructure, endpoint name, distance), closest first ||
+    #=========================================================================
+    def within(self, point, r, width = None, width_tol = 1e-9, open_only = False, exclude = None):
+
+        self._update()
+        point = np.asarray(point, dtype = float)
+        table = (self.owners, self.instances, self.names, self.points, self.dims)
+
+        rows = np.asarray(self._tree.query_ball_point(point, r), dtype = int)
+        rows = self._filter(table, rows[self._alive[rows]], width, width_tol, open_only, exclude)
+        res = self._result(table, rows, point) + self._extra_result(point, r, width, width_tol, open_only, exclude)
+
+        return sorted(res, key = lambda x: x[2])
+
+    #========================================
+    # Snap endpoint to its nearest neighbour \\
+    #=========================================================================
+    # Connects ep of structure to the closest open endpoint of another      ||
+    # structure in the index, optionally requiring equal width.             ||
+    #                                                                       ||
+    # Arguments:    structure   :   GDStructure to move                     ||
+    #               ep          :   endpoint of structure to connect        ||
+    #    (optional) r           :   maximum snapping distance               ||
+    #               match_width :   require equal endpoint_dims             ||
+    #=========================================================================
+    def snap(self, structure, ep, r = np.inf, match_width = True, width_tol = 1e-9, **kwargs):
+
+        width = structure.endpoint_dims.get(ep) if match_width and structure.endpoint_dims else None
+        found = self.nearest(structure.endpoints[ep], width = width, width_tol = width_tol, open_only = True, exclude = structure)
+
+        if not found or found[0][2] > r:
+            return False
+
+        to, ep_to, dist = found[0]
+
+        return structure.connect(ep, to, ep_to, **kwargs)
+
+#============================
+# Connect matching endpoints \\
+#=========================================================================
+# Pairs all open endpoints of different structures that lie within      ||
+# tol of each other (and have the same width) and links them in the     ||
+# prev/next lists, closest pairs first. Each endpoint is used once.     ||
+#                                                                       ||
+# Arguments:    objects     :   list of GDStructures or EndpointIndex   ||
+#    (optional) tol         :   maximum distance between endpoints      ||
+#               match_width :   require equal endpoint_dims             ||
+#               width_tol   :   tolerance on width comparison           ||
+#               snap        :   move structures to close remaining gap  ||
+#                                                                       ||
+# Returns list of (to, ep_to, structure, ep) pairs that were connected  ||
+#=========================================================================
+def auto_connect(objects, tol = 1e-3, match_width = True, width_tol = 1e-9, snap = False):
+
+    if isinstance(objects, EndpointIndex):
+        return connect_pairs(objects, tol, match_width, width_tol, snap)
+
+    # Temporary index, detached again so later transforms do not keep notifying it
+    index = EndpointIndex(objects)
+    try:
+        return connect_pairs(index, tol, match_width, width_tol, snap)
+    finally:
+        index.close()
+
+# auto_connect() on an index, leaves the index attached
+def connect_pairs(index, tol, match_width, width_tol, snap):
+
+    index.refresh()
+
+    rows = np.flatnonzero([index.isopen(r) for r in range(len(index.points))])
+    if len(rows) < 2:
+        return []
+
+    tree = sp.cKDTree(index.points[rows], leafsize = index.leafsize)
+    pairs = tree.query_pairs(tol, output_type = 'ndarray')
+    if len(pairs) == 0:
+        return []
+
+    pairs = rows[pairs]
+    a, b = pairs[:, 0], pairs[:, 1]
+
+    keep = (index.owners[a] != index.owners[b]) | (index.instances[a] != index.instances[b])
+    if match_width:
+        da, db = index.dims[a], index.dims[b]
+        keep &= (np.abs(da - db) <= width_tol) | (np.isnan(da) & np.isnan(db))
+    a, b = a[keep], b[keep]
+
+    # Closest pairs first, ties resolved by order of the index
+    d = np.hypot(*(index.points[a] - index.points[b]).T)
+    order = np.lexsort((b, a, d))
+
+    used = np.zeros(len(index.points), dtype = bool)
+    connected = []
+    for i in order:
+        ra, rb = (a[i], b[i]) if a[i] < b[i] else (b[i], a[i])
+        if used[ra] or used[rb]:
+            continue
+        used[ra] = used[rb] = True
+
+        to, ep_to = index.structure(ra), index.names[ra]
+        s, ep = index.structure(rb), index.names[rb]
+
+        if snap:
+            s.connect(ep, to, ep_to, rotate = False)
+        else:
+            to.next[ep_to] = s
+            s.prev[ep] = to
+
+        connected.append((to, ep_to, s, ep))
+
+    return connected
@@ -0,0 +1,275 @@
+import os
+import copy
+import struct
+import numpy as np
+import gdspy as gd
+import gds_tools as gtools
+from concurrent.futures import ProcessPoolExecutor
+
+class Wafer:
+
+    def __init__(self, name = 'WAFER', path = '.wafer_tiles', unit = 1e-6, precision = 1e-9, simplify = False):
+        """Tiled wafer assembly, every tile is built in a worker process and written to its own GDS file
+
+        Args:
+            name (str, optional): name of the top level wafer cell. Defaults to 'WAFER'.
+            path (str, optional): directory to write the tile files to. Defaults to '.wafer_tiles'.
+            unit (float, optional): user unit in meters, as functions.save(). Defaults to 1e-6.
+            precision (float, optional): database unit in meters, as functions.save(). Defaults to 1e-9.
+            simplify (bool or float, optional): simplify tiles before writing them, see functions.save(). Defaults to False.
+
+        Tiles are made by a function (defined at module level, so it can be sent to a
+        worker process) that returns a GDStructure, a list of GDStructures or a gdspy
+        Cell. Only the tile file name and bounding box come back to the main process,
+        the wafer file is assembled by copying the tile files and adding a top cell
+        with a reference to every placement. Peak memory is that of the largest tile.
+
+        Tile files are named after a hash of the function, its arguments and the
+        gds_tools source code and are reused by later builds as long as these do not
+        change (the bounding box of a reused tile is only known if it was built by
+        this Wafer).
+        """
+
+        self.name = name
+        self.path = path
+        self.unit = unit
+        self.precision = precision
+        self.simplify = simplify
+
+        self.tiles = []
+        self.placements = []
+        self.results = {}
+
+    def __len__(self):
+        return len(self.placements)
+
+    #==========
+    # Add tile \\
+    #=========================================================================
+    # Arguments:    method      :   function returning the tile geometry    ||
+    #               positions   :   (x, y) or list of (x, y) to place the   ||
+    #                               tile at                                 ||
+    #    (optional) name        :   cell name of the tile                   ||
+    #               rotation    :   rotation of the placements in degrees   ||
+    #               **kwargs    :   arguments for method                    ||
+    #=========================================================================
+    def add(self, method, positions, name = None, rotation = None, **kwargs):
+
+        name = method.__name__.upper() + '_' + str(len(self.tiles)) if name == None else name
+        if name == self.name or any(name == t['name'] for t in self.tiles):
+            raise ValueError('Tile name \'' + name + '\' is already in use, cannot continue')
+
+        self.tiles.append({'name': name, 'method': method, 'args': kwargs})
+
+        for p in np.asarray(positions, dtype = float).reshape(-1, 2):
+            self.placements.append((name, tuple(p.tolist()), rotation))
+
+        return self
+
+    #==================
+    # Build wafer file \\
+    #=========================================================================
+    # Arguments:    filename    :   GDS file to write the wafer to          ||
+    #    (optional) workers     :   number of worker processes, defaults to ||
+    #                               the number of cores, 1 builds the tiles ||
+    #                               in this process                         ||
+    #=========================================================================
+    def build(self, filename, workers = None):
+
+        os.makedirs(self.path, exist_ok = True)
+
+        jobs = []
+        for t in self.tiles:
+            try:
+                key = gtools.cache.digest('tile', gtools.cache.code_digest(), t['method'], t['args'], self.unit, self.precision, self.simplify)[:16]
+            except TypeError:
+                key = None
+
+            # Reuse tile file of an earlier build with the same function, arguments and gds_tools code
+            fn = os.path.join(self.path, t['name'] + ('_' + key if key else '') + '.gds')
+            if key and os.path.exists(fn):
+                if self.results.get(t['name'], (None,))[0] != fn:
+                    self.results[t['name']] = (fn, None)
+                continue
+
+            jobs.append((t['method'], t['args'], t['name'], fn, self.unit, self.precision, self.simplify))
+
+        if jobs and (workers == 1 or len(jobs) == 1):
+            results = [build_tile(*j) for j in jobs]
+        elif jobs:
+            with ProcessPoolExecutor(max_workers = workers) as executor:
+                results = list(executor.map(build_tile, *zip(*jobs)))
+        else:
+            results = []
+
+        for name, fn, bbox in results:
+            self.results[name] = (fn, bbox)
+
+        print('>> Built ' + str(len(results)) + ' of ' + str(len(self.tiles)) + ' tile(s), placing ' + str(len(self.placements)) + ' tile(s) on the wafer.')
+
+        return self.assemble(filename)
+
+    #======================
+    # Write the wafer file \\
+    #=========================================================================
+    # Copies the cells of every tile file and adds the top cell.            ||
+    #                                                                       ||
+    # Arguments:    filename    :   GDS file to write the wafer to          ||
+    #=========================================================================
+    def assemble(self, filename):
+
+        top = gd.Cell(self.name, exclude_from_current = True)
+        for name, position, rotation in self.placements:
+            top.add(gd.CellReference(name, position, rotation = rotation, ignore_missing = True))
+
+        with open(filename, 'wb') as f:
+            writer = gd.GdsWriter(f, unit = self.unit, precision = self.precision)
+            for t in self.tiles:
+                copy_cells(self.results[t['name']][0], f)
+            writer.write_cell(top)
+            writer.close()
+
+        return filename
+
+    #======================
+    # Bounding box of tile \\
+    #=========================================================================
+    # Arguments:    name    :   name of the tile                            ||
+    #                                                                       ||
+    # Returns [[xmin, ymin], [xmax, ymax]] around the origin of the tile,   ||
+    # or None before build() or for an empty tile                           ||
+    #=========================================================================
+    def bounding_box(self, name):
+        return self.results[name][1] if name in self.results else None
+
+#============================
+# Build one tile and save it \\
+#=========================================================================
+# Runs in the worker process. The tile gets a fresh gdspy library, so   ||
+# cells of earlier tiles can be freed, and all cells it references are  ||
+# written with the tile name as prefix (see rename_cells()), so cell    ||
+# names of tiles never clash.                                           ||
+#                                                                       ||
+# Returns (name, filename, bounding box)                                ||
+#=========================================================================
+def build_tile(method, args, name, filename, unit = 1e-6, precision = 1e-9, simplify = False):
+
+    library = gd.current_library
+    gd.current_library = gd.GdsLibrary()
+
+    try:
+        out = method(**args)
+
+        if not isinstance(out, gd.Cell):
+            cell = gd.Cell(name, exclude_from_current = True)
+            gtools.add(cell, out)
+            out = cell
+
+        cells = rename_cells(out, name)
+        cell = cells[0]
+
+        # Write to temporary file first, so an interrupted build never leaves half a tile
+        tmp = filename + '.' + str(os.getpid()) + '.tmp'
+        gtools.save(cells, tmp, unit = unit, precision = precision, simplify = simplify)
+        os.replace(tmp, filename)
+
+        bbox = cell.get_bounding_box()
+    finally:
+        gd.current_library = library
+
+    return name, filename, None if bbox is None else bbox.tolist()
+
+#=========================
+# Renamed copies of a tile \\
+#=========================================================================
+# A tile built in the main process may use cells of the caller, so the  ||
+# cells are never renamed. Every cell gets a shallow copy instead, with ||
+# references pointing to the copies of the cells they refer to.         ||
+#                                                                       ||
+# Arguments:    cell    :   top cell of the tile                        ||
+#               name    :   cell name of the tile, prefix of the others ||
+#                                                                       ||
+# Returns list of cells, the renamed top cell first                     ||
+#=========================================================================
+def rename_cells(cell, name):
+
+    deps = list(cell.get_dependencies(True))
+    names = {id(cell): name}
+    names.update({id(d): name + '_' + d.name for d in deps})
+
+    copies = {}
+    for c in [cell] + deps:
+        new = gd.Cell(names[id(c)], exclude_from_current = True)
+        new.polygons = list(c.polygons)
+        new.paths = list(c.paths)
+        new.labels = list(c.labels)
+        new.references = [copy.copy(r) for r in c.references]
+        copies[id(c)] = new
+
+    for new in copies.values():
+        for r in new.references:
+            if isinstance(r.ref_cell, gd.Cell) and id(r.ref_cell) in copies:
+                r.ref_cell = copies[id(r.ref_cell)]
+
+    return [copies[id(cell)]] + [copies[id(d)] for d in deps]
+
+#==========================
+# Copy cells of a GDS file \\
+#=========================================================================
+# Copies all records between the library header and ENDLIB of infile to ||
+# the open file outfile, without parsing the geometry.                  ||
+#                                                                       ||
+# Arguments:    infile  :   GDS file to copy the cells of               ||
+#               outfile :   open binary file to write to                ||
+#=========================================================================
+def copy_cells(infile, outfile, chunk = 1 << 20):
+
+    size = os.path.getsize(infile)
+
+    with open(infile, 'rb') as f:
+
+        # Skip HEADER, BGNLIB, LIBNAME, UNITS and anything else up to the first BGNSTR
+        pos = 0
+        while pos < size:
+            length, rtype = struct.unpack('>HH', f.read(4))
+            if rtype == 0x0502 or rtype == 0x0400:
+                break
+            pos += length
+            f.seek(pos)
+
+        f.seek(pos)
+        remaining = size - pos - 4
+        while remaining > 0:
+            data = f.read(min(chunk, remaining))
+            outfile.write(data)
+            remaining -= len(data)
+
+    return outfile
+
+#==========================
+# Die positions on a wafer \\
+#=========================================================================
+# Centres of all dies of a regular grid that fit completely inside the  ||
+# wafer minus its edge exclusion, the wafer centred on (0, 0).          ||
+#                                                                       ||
+# Arguments:    diameter    :   wafer diameter                          ||
+#               size        :   (x, y) die size (pitch)                 ||
+#    (optional) edge        :   edge exclusion                          ||
+#               offset      :   (x, y) shift of the die grid            ||
+#                                                                       ||
+# Returns (N, 2) array of die centres, row by row from the bottom       ||
+#=========================================================================
+def wafer_map(diameter, size, edge = 0, offset = (0, 0)):
+
+    r = diameter / 2 - edge
+    sx, sy = size
+
+    nx, ny = int(np.ceil(r / sx)) + 1, int(np.ceil(r / sy)) + 1
+    x = offset[0] + sx * np.arange(-nx, nx + 1)
+    y = offset[1] + sy * np.arange(-ny, ny + 1)
+    c = np.stack(np.meshgrid(x, y), axis = -1).reshape(-1, 2)
+
+    # Farthest corner of every die has to be inside the usable radius
+    far = np.hypot(np.abs(c[:, 0]) + sx / 2, np.abs(c[:, 1]) + sy / 2)
+
+    return c[far <= r]